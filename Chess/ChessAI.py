@@ -1,9 +1,198 @@
+import json
 import random
+import time
+import ChessEvaluation
+try:
+    import numpy as np #only needed by the batch evaluator
+except ImportError:
+    np = None
 
-pieceScore = {"K": 0, "Q": 10, "R": 5, "B": 3, "N": 3, "p": 1}
-CHECKMATE = 1000
+pieceScore = ChessEvaluation.pieceScore
+CHECKMATE = 100000
 STALEMATE = 0
-DEPTH = 2
+DEPTH = 2 #search depth used when no time or node limit is given
+MAX_DEPTH = 64 #deepest iteration tried by iterative deepening
+DELTA_MARGIN = 200 #safety margin for delta pruning in the quiescence search
+NULL_MOVE_PRUNING = True #let the opponent move twice in a row, a position still failing high is cut off
+NULL_MOVE_REDUCTION = 2 #the null move is searched this much shallower than the moves
+NULL_MOVE_MIN_DEPTH = 3
+LATE_MOVE_REDUCTIONS = True #search quiet moves late in the move order shallower, again at full depth if they fail high
+LMR_FULL_DEPTH_MOVES = 3 #moves searched at full depth before reductions start
+LMR_MIN_DEPTH = 3
+LMR_REDUCTION = 1
+HASH_SIZE_MB = 16 #memory cap for the transposition table
+SEARCH_WORKERS = 1 #worker processes for timed and fixed depth searches, see ChessParallel
+openingBook = None #ChessBook.OpeningBook played from before searching
+BOOK_SELECTION = "weighted" #"weighted" or "best", see ChessBook.OpeningBook.getMove
+tablebases = None #ChessTablebase.Tablebases probed at the root and in the search
+TABLEBASE_WIN = 50000 #score of a tablebase win, less the plies to mate
+STATS_LOG = None #path of a JSON lines file the SearchStats of every finished search are appended to
+
+#transposition table bound types
+TT_EXACT = 0
+TT_LOWERBOUND = 1
+TT_UPPERBOUND = 2
+
+'''
+Fixed size hash table of previously searched positions, keyed by the zobrist key of the position.
+Each bucket has two slots: one that keeps the deepest search seen and one that is always replaced.
+Entries are tuples of (key, depth, score, bound type, best move ID)
+'''
+class TranspositionTable():
+    ENTRY_SIZE = 160 #approximate bytes used by one stored entry, including the slot pointer
+
+    def __init__(self, sizeMB=HASH_SIZE_MB):
+        self.resize(sizeMB)
+
+    '''
+    Set the memory cap of the table. This clears all stored entries
+    '''
+    def resize(self, sizeMB):
+        self.sizeMB = sizeMB
+        buckets = max(1, int(sizeMB * 1024 * 1024) // (2 * self.ENTRY_SIZE))
+        self.numBuckets = 1 << (buckets.bit_length() - 1) #round down to a power of two so a mask can be used
+        self.mask = self.numBuckets - 1
+        self.clear()
+
+    def clear(self):
+        self.depthPreferred = [None] * self.numBuckets
+        self.alwaysReplace = [None] * self.numBuckets
+
+    '''
+    Returns the entry stored for the key or None if the position is not in the table
+    '''
+    def probe(self, key):
+        index = key & self.mask
+        entry = self.depthPreferred[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        entry = self.alwaysReplace[index]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, boundType, bestMoveID):
+        index = key & self.mask
+        entry = (key, depth, score, boundType, bestMoveID)
+        oldEntry = self.depthPreferred[index]
+        if oldEntry is None or depth >= oldEntry[1]:
+            self.depthPreferred[index] = entry
+        else:
+            self.alwaysReplace[index] = entry
+
+transpositionTable = TranspositionTable()
+
+'''
+Statistics of one search: nodes (quiescence nodes included) and quiescence nodes, the timing and node count of every
+finished iteration, beta cutoffs by the number of the move that caused them, transposition table probes, hits,
+cutoffs and stores, tablebase hits and pruned moves or nodes per pruning technique
+'''
+class SearchStats():
+    CUTOFF_BUCKETS = 16 #cutoffs on the 16th move or later are counted in the last bucket
+
+    def __init__(self):
+        self.startTime = time.perf_counter()
+        self.endTime = None
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = [0] * self.CUTOFF_BUCKETS
+        self.ttProbes = self.ttHits = self.ttCutoffs = self.ttStores = 0
+        self.tablebaseHits = 0
+        self.prunes = {} #technique -> count
+        self.iterations = []
+
+    def elapsed(self):
+        return (self.endTime or time.perf_counter()) - self.startTime
+
+    def nps(self):
+        elapsed = self.elapsed()
+        return self.nodes / elapsed if elapsed > 0 else 0.0
+
+    '''
+    Nodes of the last finished iteration divided by the nodes of the one before, None before two iterations
+    '''
+    def effectiveBranchingFactor(self):
+        return self.iterations[-1]["ebf"] if self.iterations else None
+
+    def addPrune(self, technique):
+        self.prunes[technique] = self.prunes.get(technique, 0) + 1
+
+    '''
+    Record a finished iteration
+    '''
+    def addIteration(self, depth, score, move):
+        elapsed = self.elapsed()
+        previousNodes = sum(iteration["nodes"] for iteration in self.iterations)
+        previousTime = self.iterations[-1]["time"] if self.iterations else 0.0
+        nodes = self.nodes - previousNodes
+        self.iterations.append({
+            "depth": depth,
+            "score": score,
+            "move": move.getChessNotation() if move is not None else None,
+            "nodes": nodes,
+            "time": elapsed,
+            "iterationTime": elapsed - previousTime,
+            "ebf": nodes / self.iterations[-1]["nodes"] if self.iterations and self.iterations[-1]["nodes"] else None,
+        })
+
+    '''
+    Add the counts of a search of part of the tree, e.g. by a worker process of the parallel search
+    '''
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.qnodes += other.qnodes
+        self.cutoffs = [a + b for a, b in zip(self.cutoffs, other.cutoffs)]
+        self.ttProbes += other.ttProbes
+        self.ttHits += other.ttHits
+        self.ttCutoffs += other.ttCutoffs
+        self.ttStores += other.ttStores
+        self.tablebaseHits += other.tablebaseHits
+        for technique, count in other.prunes.items():
+            self.prunes[technique] = self.prunes.get(technique, 0) + count
+
+    def toDict(self):
+        return {
+            "nodes": self.nodes,
+            "qnodes": self.qnodes,
+            "time": self.elapsed(),
+            "nps": self.nps(),
+            "depth": self.iterations[-1]["depth"] if self.iterations else 0,
+            "ebf": self.effectiveBranchingFactor(),
+            "cutoffs": sum(self.cutoffs),
+            "cutoffHistogram": self.cutoffs,
+            "ttProbes": self.ttProbes,
+            "ttHits": self.ttHits,
+            "ttCutoffs": self.ttCutoffs,
+            "ttStores": self.ttStores,
+            "tablebaseHits": self.tablebaseHits,
+            "prunes": self.prunes,
+            "iterations": self.iterations,
+        }
+
+    '''
+    Write the statistics as one JSON line
+    '''
+    def writeJSON(self, output):
+        output.write(json.dumps(self.toDict()) + "\n")
+
+'''
+Raised inside the search when the time or node budget runs out
+'''
+class SearchAborted(Exception):
+    pass
+
+MAX_PLY = 128
+#MVV-LVA values: the most valuable victim is tried first, then the least valuable attacker
+mvvLvaValues = {"p": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6}
+killerMoves = [[None, None] for ply in range(MAX_PLY)] #IDs of two quiet moves per ply that caused a beta cutoff
+historyTable = {colour + piece: [0] * 64 for colour in "wb" for piece in "pRNBQK"} #quiet cutoff scores per piece and end square
+
+searchDeadline = None #perf_counter time at which the search has to stop
+searchNodeLimit = None
+searchCancelEvent = None #threading.Event another thread sets to stop the search
+searchDepth = 0 #depth of the iteration being searched, read by the thinking readout of ChessMain
+searchStats = SearchStats() #statistics of the current or last search
+iterationCallbacks = [] #functions called with searchStats after every finished iteration of every search
 
 '''
 Picks and returns a random move
@@ -46,16 +235,166 @@ def findBestMoveMinMaxNoRecursion(gs, validMoves):
     return bestPlayerMove
 
 '''
-Helper method to make first recursive call
+Iterative deepening driver. Searches depth 1, 2, 3... until maxDepth is reached or the time limit (seconds) or
+node limit runs out or cancelEvent is set, and returns the best move of the last finished iteration. If no iteration
+finished it returns the best move the aborted one found, or the first move in search order; None only without moves.
+Positions in openingBook or tablebases are not searched, the book or tablebase move is returned.
+With no limits given it searches to DEPTH. Searches without a node limit are split across worker processes when
+workers (SEARCH_WORKERS by default) is more than 1.
+onIteration(depth, score, bestMove, nodes) is called after every finished iteration, score is for the side to move.
+The statistics of the search are kept in searchStats
+'''
+def findBestMove(gs, validMoves, maxDepth=None, timeLimit=None, nodeLimit=None, workers=None, cancelEvent=None,
+                 onIteration=None):
+    global nextMove, searchDeadline, searchNodeLimit, searchCancelEvent, searchDepth
+    if openingBook is not None:
+        bookMove = openingBook.getMove(gs, validMoves, BOOK_SELECTION)
+        if bookMove is not None:
+            return bookMove
+    if tablebases is not None and tablebases.mayCover(gs):
+        tablebaseMove = tablebases.bestMove(gs, validMoves)
+        if tablebaseMove is not None:
+            return tablebaseMove
+    if workers is None:
+        workers = SEARCH_WORKERS
+    if workers > 1 and nodeLimit is None:
+        import ChessParallel
+        return ChessParallel.findBestMoveParallel(gs, validMoves, workers, maxDepth, timeLimit, cancelEvent, onIteration)
+    if maxDepth is None:
+        maxDepth = DEPTH if timeLimit is None and nodeLimit is None else MAX_DEPTH
+    startSearchStats()
+    clearMoveOrdering()
+    searchDeadline = None if timeLimit is None else time.perf_counter() + timeLimit
+    searchNodeLimit = nodeLimit
+    searchCancelEvent = cancelEvent
+    moveLogLength = len(gs.moveLog)
+    bestMove = None
+    for depth in range(1, maxDepth + 1):
+        searchDepth = depth
+        nextMove = None
+        try:
+            #findMoveNegaMax(gs, validMoves, depth, 1 if gs.whiteToMove else -1)
+            score = findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
+        except SearchAborted:
+            #take back the moves the aborted iteration was in the middle of
+            while len(gs.moveLog) > moveLogLength:
+                gs.undoMove()
+            if bestMove is None: #not even depth 1 finished, use what the partial iteration found
+                bestMove = nextMove
+            break
+        bestMove = nextMove
+        finishIteration(depth, score, bestMove, onIteration)
+        if abs(score) >= CHECKMATE: #forced mate found, searching deeper won't change the result
+            break
+        if cancelEvent is not None and cancelEvent.is_set(): #set by onIteration, or between two node checks
+            break
+    if bestMove is None and len(validMoves) > 0: #aborted before the first root move was searched
+        bestMove = validMoves[0] if moveOrdering is None else moveOrdering(gs, validMoves, None, 0)[0]
+    finishSearchStats()
+    return bestMove
+
+def startSearchStats():
+    global searchStats
+    searchStats = SearchStats()
+
+'''
+Record a finished iteration in searchStats and call onIteration and the iterationCallbacks
+'''
+def finishIteration(depth, score, bestMove, onIteration=None):
+    searchStats.addIteration(depth, score, bestMove)
+    if onIteration is not None:
+        onIteration(depth, score, bestMove, searchStats.nodes)
+    for callback in iterationCallbacks:
+        callback(searchStats)
+
+'''
+Stop the clock of searchStats and append them to STATS_LOG when it is set
+'''
+def finishSearchStats():
+    searchStats.endTime = time.perf_counter()
+    if STATS_LOG is not None:
+        with open(STATS_LOG, "a") as statsLog:
+            searchStats.writeJSON(statsLog)
+
+'''
+Follow the best moves stored in the transposition table from the position in gs, up to maxLength moves.
+Returns the list of moves, gs is left as it was
+'''
+def getPrincipalVariation(gs, maxLength=MAX_DEPTH):
+    pv = []
+    seenKeys = set()
+    while len(pv) < maxLength and gs.zobristKey not in seenKeys:
+        seenKeys.add(gs.zobristKey)
+        ttEntry = transpositionTable.probe(gs.zobristKey)
+        if ttEntry is None or ttEntry[4] is None:
+            break
+        move = next((move for move in gs.getValidMoves() if move.moveID == ttEntry[4]), None)
+        if move is None:
+            break
+        gs.makeMove(move)
+        pv.append(move)
+    for move in pv:
+        gs.undoMove()
+    return pv
+
+'''
+Order the moves to search: hash move, captures by MVV-LVA, killer moves, then quiet moves by the history heuristic
+'''
+def orderMoves(gs, moves, hashMoveID, ply):
+    killers = killerMoves[ply]
+    def moveScore(move):
+        if move.moveID == hashMoveID:
+            return 1000000
+        if move.isCapture:
+            return 100000 + 10 * mvvLvaValues[move.pieceCaptured[1]] - mvvLvaValues[move.pieceMoved[1]]
+        if move.moveID == killers[0]:
+            return 90000
+        if move.moveID == killers[1]:
+            return 89000
+        return historyTable[move.pieceMoved][move.endRow * 8 + move.endCol]
+    return sorted(moves, key=moveScore, reverse=True)
+
+moveOrdering = orderMoves #function used to order the moves before the move loop, None searches in generation order
+STAGED_MOVE_GENERATION = True #generate the moves below the root in stages (GameState.getStagedMoves) instead of all at once
+
+'''
+History score of a quiet move, orders the last stage of the staged move generation
+'''
+def historyScore(move):
+    return historyTable[move.pieceMoved][move.endRow * 8 + move.endCol]
+
+'''
+Remember a quiet move that caused a beta cutoff as a killer for this ply and in the history table
 '''
-def findBestMove(gs, validMoves):
-    global nextMove, counter
-    nextMove = None
-    counter = 0
-    #findMoveNegaMax(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    print(counter)
-    return nextMove
+def updateQuietCutoff(move, depth, ply):
+    killers = killerMoves[ply]
+    if killers[0] != move.moveID:
+        killers[1] = killers[0]
+        killers[0] = move.moveID
+    history = historyTable[move.pieceMoved]
+    history[move.endRow * 8 + move.endCol] += depth * depth
+    if history[move.endRow * 8 + move.endCol] >= 80000: #keep history scores below the killer scores
+        for scores in historyTable.values():
+            for i in range(64):
+                scores[i] //= 2
+
+def clearMoveOrdering():
+    for killers in killerMoves:
+        killers[0] = killers[1] = None
+    for scores in historyTable.values():
+        for i in range(64):
+            scores[i] = 0
+
+'''
+Abort the search if the time or node budget is used up or the search was cancelled
+'''
+def checkSearchLimits():
+    if searchCancelEvent is not None and searchCancelEvent.is_set():
+        raise SearchAborted()
+    if searchNodeLimit is not None and searchStats.nodes >= searchNodeLimit:
+        raise SearchAborted()
+    if searchDeadline is not None and time.perf_counter() >= searchDeadline:
+        raise SearchAborted()
 
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
      global nextMove
@@ -88,8 +427,8 @@ def findMoveMinMax(gs, validMoves, depth, whiteToMove):
          return minScore
 
 def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
-    global nextMove, counter
-    counter += 1
+    global nextMove
+    searchStats.nodes += 1
     if depth == 0:
         return turnMultiplier * scoreBoard(gs)
 
@@ -105,25 +444,183 @@ def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
         gs.undoMove()
     return maxScore
 
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove, counter
-    counter += 1
-    if depth == 0:
+'''
+Alpha-beta negamax with a transposition table, tablebase probes, null move pruning and late move reductions.
+Returns the score for the side to move; at the root the best move is left in nextMove. allowNull is False right
+after a null move, so two null moves never follow each other
+'''
+def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier, ply=0, allowNull=True):
+    global nextMove
+    stats = searchStats
+    stats.nodes += 1
+    if stats.nodes & 1023 == 0:
+        checkSearchLimits()
+    if gs.checkmate or gs.stalemate:
         return turnMultiplier * scoreBoard(gs)
+    if ply > 0 and tablebases is not None and tablebases.mayCover(gs):
+        tablebaseValue = tablebases.probe(gs)
+        if tablebaseValue is not None:
+            stats.tablebaseHits += 1
+            return tablebaseScore(tablebaseValue)
+    if depth == 0:
+        return quiescence(gs, alpha, beta, turnMultiplier, ply)
+
+    alphaOriginal = alpha
+    hashMoveID = None
+    ttEntry = transpositionTable.probe(gs.zobristKey)
+    stats.ttProbes += 1
+    if ttEntry is not None:
+        stats.ttHits += 1
+        hashMoveID = ttEntry[4]
+        if ply > 0 and ttEntry[1] >= depth: #never cut at the root, a move has to be returned
+            ttScore = ttEntry[2]
+            if ttEntry[3] == TT_EXACT:
+                stats.ttCutoffs += 1
+                return ttScore
+            elif ttEntry[3] == TT_LOWERBOUND:
+                alpha = max(alpha, ttScore)
+            else:
+                beta = min(beta, ttScore)
+            if alpha >= beta:
+                stats.ttCutoffs += 1
+                return ttScore
 
-    #move ordering - #TODO
+    if NULL_MOVE_PRUNING and allowNull and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and abs(beta) < TABLEBASE_WIN and \
+            turnMultiplier * scoreBoard(gs) >= beta and nullMoveIsSafe(gs):
+        #if passing still fails high, a real move would too. Unwind moves the search was in the middle of
+        #before taking back the null move when it aborts
+        moveLogLength = len(gs.moveLog)
+        gs.makeNullMove()
+        try:
+            score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + 1,
+                                              -turnMultiplier, ply + 1, False)
+        except SearchAborted:
+            while len(gs.moveLog) > moveLogLength:
+                gs.undoMove()
+            gs.undoNullMove()
+            raise
+        gs.undoNullMove()
+        if score >= beta:
+            stats.addPrune("nullMove")
+            return beta
+
+    if validMoves is None and STAGED_MOVE_GENERATION:
+        moves = gs.getStagedMoves(hashMoveID, killerMoves[ply], historyScore if moveOrdering is not None else None)
+    else:
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        moves = validMoves if moveOrdering is None else moveOrdering(gs, validMoves, hashMoveID, ply)
     maxScore = -CHECKMATE
-    for move in validMoves:
+    bestMoveID = None
+    i = -1
+    for i, move in enumerate(moves):
+        if i == 0:
+            inCheck = gs.inCheck #set by the move generation, which the staged generator only runs on the first move
         gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
+        #the moves of the child are generated by the child, only once the transposition table can't cut it off
+        if LATE_MOVE_REDUCTIONS and i >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH and ply > 0 and \
+                not inCheck and not move.isCapture and not move.pawnPromotion and not sideToMoveInCheck(gs):
+            stats.addPrune("lmr")
+            score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - LMR_REDUCTION, -alpha - 1, -alpha,
+                                              -turnMultiplier, ply + 1)
+            if score > alpha: #the reduced search failed high, it might be a good move after all
+                stats.addPrune("lmrResearch")
+                score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier, ply + 1)
+        else:
+            score = -findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier, ply + 1)
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
+            bestMoveID = move.moveID
+            if ply == 0:
                 nextMove = move
         gs.undoMove()
         if maxScore > alpha: #pruning happens
             alpha = maxScore
+        if alpha >= beta:
+            stats.cutoffs[min(i, SearchStats.CUTOFF_BUCKETS - 1)] += 1
+            if not move.isCapture:
+                updateQuietCutoff(move, depth, ply)
+            break
+    if i < 0: #no legal moves, gs.inCheck is still the one set by the move generation of this node
+        return -CHECKMATE if gs.inCheck else STALEMATE
+
+    if maxScore <= alphaOriginal:
+        boundType = TT_UPPERBOUND
+    elif maxScore >= beta:
+        boundType = TT_LOWERBOUND
+    else:
+        boundType = TT_EXACT
+    transpositionTable.store(gs.zobristKey, depth, maxScore, boundType, bestMoveID)
+    stats.ttStores += 1
+    return maxScore
+
+'''
+Null move pruning is wrong in zugzwang, where passing would be the best move. Only allow it when the side to move is
+not in check and has a piece other than pawns and the king, which makes zugzwang rare
+'''
+def nullMoveIsSafe(gs):
+    if sideToMoveInCheck(gs):
+        return False
+    allyColour = "w" if gs.whiteToMove else "b"
+    return any(piece[0] == allyColour and piece[1] in "NBRQ" for row in gs.board for piece in row)
+
+'''
+Whether the king of the side to move is attacked. Unlike gs.inCheck this doesn't need the moves to be generated, so
+after makeMove it tells if the move gave check
+'''
+def sideToMoveInCheck(gs):
+    kingRow, kingCol = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
+    return gs.squareUnderAttack(kingRow, kingCol, "w" if gs.whiteToMove else "b")
+
+'''
+Score for the side to move of a tablebase value (see ChessTablebase.DRAW). Faster mates score higher
+'''
+def tablebaseScore(value):
+    if value > 0:
+        return TABLEBASE_WIN - value
+    if value < 0:
+        return -TABLEBASE_WIN - value - 1
+    return STALEMATE
+
+'''
+Search captures only until the position is quiet, so the leaves are not scored in the middle of an exchange.
+When in check every evasion is searched instead
+'''
+def quiescence(gs, alpha, beta, turnMultiplier, ply):
+    stats = searchStats
+    stats.nodes += 1
+    stats.qnodes += 1
+    if stats.nodes & 1023 == 0:
+        checkSearchLimits()
+    if ply >= MAX_PLY - 1: #the move ordering tables end here, also when in check
+        return turnMultiplier * scoreBoard(gs)
+    moves = gs.getCaptureMoves()
+    inCheck = gs.inCheck #the attribute is overwritten when searching deeper
+    if inCheck:
+        if len(moves) == 0:
+            return -CHECKMATE
+        maxScore = -CHECKMATE
+    else:
+        standPat = turnMultiplier * scoreBoard(gs)
+        if standPat >= beta:
+            return standPat
+        if standPat + pieceScore['Q'] + DELTA_MARGIN < alpha: #delta pruning, even winning a queen can't raise alpha
+            stats.addPrune("delta")
+            return standPat
+        if standPat > alpha:
+            alpha = standPat
+        maxScore = standPat
+    for move in orderMoves(gs, moves, None, ply):
+        if not inCheck and not move.pawnPromotion and standPat + pieceScore[move.pieceCaptured[1]] + DELTA_MARGIN <= alpha:
+            stats.addPrune("delta") #delta pruning, this capture can't raise alpha
+            continue
+        gs.makeMove(move)
+        score = -quiescence(gs, -beta, -alpha, -turnMultiplier, ply + 1)
+        gs.undoMove()
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
         if alpha >= beta:
             break
     return maxScore
@@ -140,15 +637,29 @@ def scoreBoard(gs):
     elif gs.stalemate:
         return STALEMATE
 
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScore[square[1]]
-            elif square[0] == 'b':
-                score -= pieceScore[square[1]]
+    #the terms are kept up to date by makeMove and undoMove
+    return ChessEvaluation.taperedScore(gs.middlegameScore, gs.endgameScore, gs.gamePhase)
+
+'''
+Score many positions at once. Takes an (N, 64) array of piece indexes (see ChessEvaluation.encodeBoard) and returns
+N scores, the same numbers scoreBoard gives for the positions when they are not checkmate or stalemate
+'''
+def scoreBoards(pieceIndexes):
+    if np is None:
+        raise ImportError("scoreBoards needs numpy")
+    global middlegameTable, endgameTable, phaseTable
+    if middlegameTable is None: #lookup tables of shape (13, 64) and (13,) indexed by piece index and square
+        middlegameTable = np.array([ChessEvaluation.middlegameScores[piece] for piece in ChessEvaluation.PIECES], dtype=np.int64)
+        endgameTable = np.array([ChessEvaluation.endgameScores[piece] for piece in ChessEvaluation.PIECES], dtype=np.int64)
+        phaseTable = np.array([ChessEvaluation.piecePhase[piece] for piece in ChessEvaluation.PIECES], dtype=np.int64)
+    pieceIndexes = np.asarray(pieceIndexes, dtype=np.intp).reshape(-1, 64)
+    squareIndexes = np.arange(64)
+    middlegame = middlegameTable[pieceIndexes, squareIndexes].sum(axis=1)
+    endgame = endgameTable[pieceIndexes, squareIndexes].sum(axis=1)
+    phase = np.minimum(phaseTable[pieceIndexes].sum(axis=1), ChessEvaluation.MAX_PHASE)
+    return (middlegame * phase + endgame * (ChessEvaluation.MAX_PHASE - phase)) // ChessEvaluation.MAX_PHASE
 
-    return score
+middlegameTable = endgameTable = phaseTable = None
 
 '''
 Score the board based on material
@@ -160,6 +671,6 @@ def scoreMaterial(board):
             if square[0] == 'w':
                 score += pieceScore[square[1]]
             elif square[0] == 'b':
-                score += pieceScore[square[1]]
+                score -= pieceScore[square[1]]
 
     return score
\ No newline at end of file
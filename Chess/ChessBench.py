@@ -0,0 +1,97 @@
+# Search benchmark. Runs fixed depth searches over a set of positions and reports nodes, cutoffs and time,
+# without move ordering, with move ordering and with staged move generation.
+# Usage:
+#   python ChessBench.py --depth 3
+#   python ChessBench.py --selective 5     depth reached in 5 seconds per position with and without null move
+#                                          pruning and late move reductions
+
+import argparse
+import time
+import ChessEngine, ChessAI
+
+#positions reached by playing these moves from the start position
+BENCH_POSITIONS = [
+    "",
+    "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6",
+    "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7",
+    "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6",
+]
+
+'''
+Play a space separated list of moves in coordinate notation (e.g. "e2e4 e7e5") on the game state
+'''
+def playMoves(gs, moveString):
+    for token in moveString.split():
+        for move in gs.getValidMoves():
+            if move.getChessNotation() == token:
+                gs.makeMove(move)
+                break
+        else:
+            raise ValueError("illegal move " + token)
+    return gs
+
+'''
+Search every bench position to the given depth and return the summed node and cutoff counts and elapsed time
+'''
+def benchSearch(depth, ordering=True, staged=True):
+    savedOrdering, savedStaged = ChessAI.moveOrdering, ChessAI.STAGED_MOVE_GENERATION
+    ChessAI.moveOrdering = ChessAI.orderMoves if ordering else None
+    ChessAI.STAGED_MOVE_GENERATION = staged
+    nodes = cutoffs = firstMoveCutoffs = 0
+    startTime = time.perf_counter()
+    try:
+        for moveString in BENCH_POSITIONS:
+            gs = playMoves(ChessEngine.createGameState(), moveString)
+            ChessAI.transpositionTable.clear()
+            ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=depth)
+            nodes += ChessAI.searchStats.nodes
+            cutoffs += sum(ChessAI.searchStats.cutoffs)
+            firstMoveCutoffs += ChessAI.searchStats.cutoffs[0]
+    finally:
+        ChessAI.moveOrdering, ChessAI.STAGED_MOVE_GENERATION = savedOrdering, savedStaged
+    return nodes, cutoffs, firstMoveCutoffs, time.perf_counter() - startTime
+
+'''
+Search every bench position for timeLimit seconds with null move pruning and late move reductions switched on or off.
+Returns the depth reached per position and the summed node count
+'''
+def depthInTime(timeLimit, nullMove, lateMoveReductions):
+    savedNullMove, savedReductions = ChessAI.NULL_MOVE_PRUNING, ChessAI.LATE_MOVE_REDUCTIONS
+    ChessAI.NULL_MOVE_PRUNING, ChessAI.LATE_MOVE_REDUCTIONS = nullMove, lateMoveReductions
+    depths = []
+    nodes = 0
+    try:
+        for moveString in BENCH_POSITIONS:
+            gs = playMoves(ChessEngine.createGameState(), moveString)
+            ChessAI.transpositionTable.clear()
+            ChessAI.findBestMove(gs, gs.getValidMoves(), timeLimit=timeLimit, workers=1)
+            depths.append(ChessAI.searchStats.iterations[-1]["depth"] if ChessAI.searchStats.iterations else 0)
+            nodes += ChessAI.searchStats.nodes
+    finally:
+        ChessAI.NULL_MOVE_PRUNING, ChessAI.LATE_MOVE_REDUCTIONS = savedNullMove, savedReductions
+    return depths, nodes
+
+def main():
+    parser = argparse.ArgumentParser(description="Fixed depth search benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--stats-log", help="append the statistics of every search to this JSON lines file")
+    parser.add_argument("--selective", type=float, metavar="SECONDS",
+                        help="compare the depth reached in fixed time with and without selective search")
+    args = parser.parse_args()
+    ChessAI.STATS_LOG = args.stats_log
+    if args.selective is not None:
+        for nullMove, lateMoveReductions in ((False, False), (True, False), (False, True), (True, True)):
+            depths, nodes = depthInTime(args.selective, nullMove, lateMoveReductions)
+            print("null move %-3s LMR %-3s %.1fs: depth %.2f on average (%s), %d nodes" %
+                  ("on" if nullMove else "off", "on" if lateMoveReductions else "off", args.selective,
+                   sum(depths) / len(depths), " ".join(map(str, depths)), nodes))
+        return
+    for ordering, staged in ((False, False), (True, False), (True, True)):
+        nodes, cutoffs, firstMoveCutoffs, elapsed = benchSearch(args.depth, ordering, staged)
+        firstMoveRate = 100.0 * firstMoveCutoffs / cutoffs if cutoffs else 0.0
+        print("ordering %-3s %-6s depth %d: %d nodes, %d cutoffs (%.1f%% on first move), %.2fs, %.0f nodes/sec" %
+              ("on" if ordering else "off", "staged" if staged else "eager", args.depth, nodes, cutoffs, firstMoveRate,
+               elapsed, nodes / elapsed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# EPD test suites. Searches the positions of a suite with bm (best move) and am (avoid move) operations, a time budget
+# per position and a pool of worker processes, and writes one JSON line per position followed by a summary line.
+# Usage: python ChessEPD.py wac.epd --time 5 --workers 4 --output results.jsonl
+
+import argparse
+import json
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import ChessEngine, ChessAI, ChessPGN
+
+operationPattern = re.compile(r'(\w+)((?:\s+(?:"[^"]*"|[^;"\s]+))*)\s*;')
+operandPattern = re.compile(r'"([^"]*)"|([^\s"]+)')
+
+'''
+Split an EPD line into a FEN and a dict of its operations (opcode -> list of operands).
+The FEN move counters come from the hmvc and fmvn operations when present
+'''
+def parseEPD(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("malformed EPD: " + line)
+    operations = {}
+    for opcode, operands in operationPattern.findall(fields[4] if len(fields) > 4 else ""):
+        operations[opcode] = [quoted or plain for quoted, plain in operandPattern.findall(operands)]
+    fen = " ".join(fields[:4] + [operations.get("hmvc", ["0"])[0], operations.get("fmvn", ["1"])[0]])
+    return fen, operations
+
+'''
+The legal move written in SAN or coordinate notation (e.g. "Nf3" or "g1f3")
+'''
+def parseMove(gs, text, validMoves):
+    try:
+        return ChessPGN.parseSAN(gs, text, validMoves)
+    except ValueError:
+        for move in validMoves:
+            if move.getChessNotation() == text:
+                return move
+        raise
+
+'''
+Runs in a worker process. Search one EPD position for timeLimit seconds and return its result as a dict.
+timeToSolution is the time of the iteration from which on the best move stayed a solution, None if not solved
+'''
+def solvePosition(task):
+    number, line, timeLimit = task
+    result = {"position": number}
+    try:
+        fen, operations = parseEPD(line)
+        result["id"] = operations.get("id", [str(number)])[0]
+        result["fen"] = fen
+        gs = ChessEngine.createGameState(fen=fen)
+        validMoves = gs.getValidMoves()
+        bestMoveIDs = set(parseMove(gs, text, validMoves).moveID for text in operations.get("bm", []))
+        avoidMoveIDs = set(parseMove(gs, text, validMoves).moveID for text in operations.get("am", []))
+    except ValueError as error:
+        result["error"] = str(error)
+        return result
+    result["bm"] = operations.get("bm", [])
+    result["am"] = operations.get("am", [])
+
+    def isSolution(move):
+        return move is not None and (not bestMoveIDs or move.moveID in bestMoveIDs) and move.moveID not in avoidMoveIDs
+
+    iterations = []
+    startTime = time.perf_counter()
+    def onIteration(depth, score, move, nodes):
+        iterations.append((time.perf_counter() - startTime, depth, score, move))
+
+    ChessAI.transpositionTable.clear()
+    move = ChessAI.findBestMove(gs, validMoves, timeLimit=timeLimit, workers=1, onIteration=onIteration)
+    elapsed = time.perf_counter() - startTime
+    timeToSolution = None
+    if isSolution(move):
+        timeToSolution = elapsed
+        for iterationTime, depth, score, iterationMove in reversed(iterations):
+            if not isSolution(iterationMove):
+                break
+            timeToSolution = iterationTime
+    result.update({
+        "move": move.getChessNotation() if move is not None else None,
+        "solved": timeToSolution is not None,
+        "timeToSolution": timeToSolution,
+        "depth": iterations[-1][1] if iterations else 0,
+        "score": iterations[-1][2] if iterations else None,
+        "nodes": ChessAI.searchStats.nodes,
+        "time": elapsed,
+        "nps": ChessAI.searchStats.nodes / elapsed if elapsed > 0 else 0.0,
+        "stats": ChessAI.searchStats.toDict(),
+    })
+    return result
+
+'''
+Search every position of an EPD file and write the JSON lines to output. Returns the summary dict
+'''
+def runSuite(path, timeLimit, workers, output):
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    tasks = [(number, line, timeLimit) for number, line in enumerate(lines, 1)]
+    summary = {"summary": True, "positions": len(tasks), "solved": 0, "errors": 0, "nodes": 0, "searchTime": 0.0}
+    startTime = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for result in pool.map(solvePosition, tasks):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            if "error" in result:
+                summary["errors"] += 1
+                continue
+            summary["solved"] += result["solved"]
+            summary["nodes"] += result["nodes"]
+            summary["searchTime"] += result["time"]
+    summary["wallTime"] = time.perf_counter() - startTime
+    summary["nps"] = summary["nodes"] / summary["searchTime"] if summary["searchTime"] > 0 else 0.0
+    output.write(json.dumps(summary) + "\n")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="EPD test suite runner")
+    parser.add_argument("suite", help="EPD file with bm and/or am operations")
+    parser.add_argument("--time", type=float, default=5.0, help="search time per position in seconds")
+    parser.add_argument("--workers", type=int, default=1, help="positions searched at the same time")
+    parser.add_argument("--output", help="file for the JSON lines, standard output by default")
+    args = parser.parse_args()
+    if args.output is None:
+        runSuite(args.suite, args.time, args.workers, sys.stdout)
+    else:
+        with open(args.output, "w") as output:
+            summary = runSuite(args.suite, args.time, args.workers, output)
+        print("solved %d of %d positions" % (summary["solved"], summary["positions"]))
+
+if __name__ == "__main__":
+    main()
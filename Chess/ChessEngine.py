@@ -1,3 +1,47 @@
+import random
+from ChessEvaluation import middlegameScores, endgameScores, piecePhase, pieceScore
+
+#Zobrist keys used to hash positions. Seeded so that keys are the same in every process
+zobristRandom = random.Random(20220131)
+zobristPieceKeys = {colour + piece: [zobristRandom.getrandbits(64) for sq in range(64)]
+                    for colour in "wb" for piece in "pRNBQK"}
+zobristCastleKeys = [zobristRandom.getrandbits(64) for i in range(4)] #wks, bks, wqs, bqs
+zobristEnpassantKeys = [zobristRandom.getrandbits(64) for col in range(8)] #one per file
+zobristBlackToMoveKey = zobristRandom.getrandbits(64)
+
+#Attack tables, built once at import so the move generation and attack tests don't loop over directions with bounds
+#checks. Rook directions come first in DIRECTIONS, then bishop directions
+DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+
+def onBoardTargets(r, c, offsets):
+    return tuple((r + dr, c + dc, dr, dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+
+#rays[r][c][j]: the squares from (r, c) to the edge of the board in direction DIRECTIONS[j], nearest first
+rays = [[tuple(tuple((r + dr * i, c + dc * i) for i in range(1, 8) if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8)
+               for dr, dc in DIRECTIONS) for c in range(8)] for r in range(8)]
+#(endRow, endCol, row offset, col offset) of the knight and king moves from (r, c)
+knightTargets = [[onBoardTargets(r, c, KNIGHT_OFFSETS) for c in range(8)] for r in range(8)]
+kingTargets = [[onBoardTargets(r, c, KING_OFFSETS) for c in range(8)] for r in range(8)]
+#pawnCaptureTargets[colour][r][c]: squares a pawn of that colour on (r, c) captures on, left first.
+#pawnAttackers[colour][r][c]: squares a pawn of that colour attacks (r, c) from, with the offset from (r, c)
+pawnCaptureTargets = {colour: [[onBoardTargets(r, c, ((forward, -1), (forward, 1))) for c in range(8)]
+                               for r in range(8)] for colour, forward in (("w", -1), ("b", 1))}
+pawnAttackers = {colour: [[onBoardTargets(r, c, ((-forward, -1), (-forward, 1))) for c in range(8)]
+                          for r in range(8)] for colour, forward in (("w", -1), ("b", 1))}
+
+DEBUG_EVAL = False #check the incremental evaluation against a full rescan after every move
+
+'''
+Create a game state, starting from the FEN position if one is given
+'''
+def createGameState(fen=None):
+    gs = GameState()
+    if fen is not None:
+        gs.loadFEN(fen)
+    return gs
+
 '''
 This class is responsible for storing all the information about the current state of a chess game. It will also be
 responsible for determining the valid moves at the current state. It will also keep a move log.
@@ -39,11 +83,137 @@ class GameState():
         self.currentCastlingRight = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.whiteCastleKingside, self.blackCastleKingside,
                                              self.whiteCastleQueenside, self.blackCastleQueenside)]
+        #plies since the last capture or pawn move (fifty move rule) and the FEN move number
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1
+        #64 bit position key, updated incrementally by makeMove and restored by undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        #evaluation terms from ChessEvaluation, positive is good for white. Updated by makeMove and undoMove
+        self.middlegameScore, self.endgameScore, self.gamePhase = self.computeEvaluationTerms()
+        #pieces other than the kings per colour, updated by makeMove and undoMove
+        self.pieceCounts = self.countPieces()
+
+    '''
+    Set up the position described by a FEN string: board, side to move, castling rights, en passant square and the
+    halfmove clock and fullmove number (both optional). The move log is cleared. Raises ValueError for a malformed FEN
+    or a board without exactly one king per side, and leaves the game state unchanged then
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        if len(fields) < 2 or len(fields) > 6:
+            raise ValueError("malformed FEN: " + fen)
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks: " + fen)
+        board = []
+        kingLocations = {"wK": [], "bK": []}
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in "pnbrqkPNBRQK":
+                    piece = ('w' if char.isupper() else 'b') + (char.upper() if char.lower() != 'p' else 'p')
+                    if piece in kingLocations:
+                        kingLocations[piece].append((len(board), len(row)))
+                    row.append(piece)
+                else:
+                    raise ValueError("bad piece %r in FEN: %s" % (char, fen))
+            if len(row) != 8:
+                raise ValueError("FEN rank %r is not 8 squares: %s" % (rank, fen))
+            board.append(row)
+        if len(kingLocations["wK"]) != 1 or len(kingLocations["bK"]) != 1:
+            raise ValueError("FEN needs one king per side: " + fen)
+        if any(piece[1] == 'p' for piece in board[0] + board[7]):
+            raise ValueError("pawn on the first or last rank in FEN: " + fen)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("bad side to move in FEN: " + fen)
+        whiteToMove = fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        if castling != '-' and (castling.strip("KQkq") != "" or len(set(castling)) != len(castling)):
+            raise ValueError("bad castling rights in FEN: " + fen)
+        enpassant = fields[3] if len(fields) > 3 else '-'
+        if enpassant == '-':
+            enpassantPossible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.filesToCols and enpassant[1] == ('6' if whiteToMove else '3'):
+            enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            raise ValueError("bad en passant square in FEN: " + fen)
+        try:
+            halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("bad move counters in FEN: " + fen) from None
+        if halfmoveClock < 0 or fullmoveNumber < 1:
+            raise ValueError("bad move counters in FEN: " + fen)
+
+        self.board = board
+        self.whiteKingLocation = kingLocations["wK"][0]
+        self.blackKingLocation = kingLocations["bK"][0]
+        self.whiteToMove = whiteToMove
+        self.whiteCastleKingside = 'K' in castling
+        self.whiteCastleQueenside = 'Q' in castling
+        self.blackCastleKingside = 'k' in castling
+        self.blackCastleQueenside = 'q' in castling
+        self.currentCastlingRight = CastleRights(self.whiteCastleKingside, self.blackCastleKingside,
+                                                 self.whiteCastleQueenside, self.blackCastleQueenside)
+        self.castleRightsLog = [CastleRights(self.whiteCastleKingside, self.blackCastleKingside,
+                                             self.whiteCastleQueenside, self.blackCastleQueenside)]
+        self.enpassantPossible = enpassantPossible
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = fullmoveNumber
+        self.moveLog = []
+        self.inCheck = False
+        self.pins = []
+        self.checks = []
+        self.checkmate = False
+        self.stalemate = False
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        self.middlegameScore, self.endgameScore, self.gamePhase = self.computeEvaluationTerms()
+        self.pieceCounts = self.countPieces()
+
+    '''
+    FEN string of the current position, including the halfmove clock and fullmove number
+    '''
+    def getFEN(self):
+        ranks = []
+        for row in self.board:
+            rank = ""
+            emptySquares = 0
+            for piece in row:
+                if piece == "--":
+                    emptySquares += 1
+                    continue
+                if emptySquares > 0:
+                    rank += str(emptySquares)
+                    emptySquares = 0
+                rank += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            if emptySquares > 0:
+                rank += str(emptySquares)
+            ranks.append(rank)
+        castling = ('K' if self.whiteCastleKingside else '') + ('Q' if self.whiteCastleQueenside else '') + \
+                   ('k' if self.blackCastleKingside else '') + ('q' if self.blackCastleQueenside else '')
+        enpassant = '-'
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        return "%s %s %s %s %d %d" % ("/".join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enpassant,
+                                      self.halfmoveClock, self.fullmoveNumber)
 
     '''
     Takes a move as a parameter and executes it (doesn't work for castling, pawn promotion and en-passant)
     '''
     def makeMove(self, move):
+        key = self.zobristKey ^ zobristBlackToMoveKey ^ self.castleRightsKey() ^ self.enpassantKey()
+        key ^= zobristPieceKeys[move.pieceMoved][move.startRow * 8 + move.startCol]
+        if move.isEnpassantMove:
+            key ^= zobristPieceKeys[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != "--":
+            key ^= zobristPieceKeys[move.pieceCaptured][move.endRow * 8 + move.endCol]
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
         self.moveLog.append(move) #log the move to undo later
@@ -63,8 +233,7 @@ class GameState():
             self.board[move.startRow][move.endCol] = '--' #capturing the pawn
         #pawn promotion, change piece
         if move.pawnPromotion:
-            #promotedPiece = input("Promote to Q, R, B, or N: ") #can make this part of the ui later
-            promotedPiece = 'Q'
+            promotedPiece = move.promotionChoice
             self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
         #update castling rights
         self.updateCastleRights(move)
@@ -79,14 +248,59 @@ class GameState():
             else: #queenside castle move
                 self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol-2] #moves the rook
                 self.board[move.endRow][move.endCol - 2] = '--' #erase old rook
+            rookKeys = zobristPieceKeys[move.pieceMoved[0] + 'R']
+            if move.endCol - move.startCol == 2:
+                key ^= rookKeys[move.endRow * 8 + move.endCol + 1] ^ rookKeys[move.endRow * 8 + move.endCol - 1]
+            else:
+                key ^= rookKeys[move.endRow * 8 + move.endCol - 2] ^ rookKeys[move.endRow * 8 + move.endCol + 1]
 
         self.enpassantPossibleLog.append(self.enpassantPossible)
+        self.halfmoveClock = 0 if move.pieceMoved[1] == 'p' or move.isCapture else self.halfmoveClock + 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.whiteToMove: #black's move ends a full move, the turn is already swapped
+            self.fullmoveNumber += 1
+        #piece on the end square is the promoted piece if the move was a promotion
+        key ^= zobristPieceKeys[self.board[move.endRow][move.endCol]][move.endRow * 8 + move.endCol]
+        key ^= self.castleRightsKey() ^ self.enpassantKey()
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+        self.updateEvaluationTerms(move, 1)
+        if move.pieceCaptured != "--":
+            self.pieceCounts[move.pieceCaptured[0]] -= 1
+        if DEBUG_EVAL:
+            assert (self.middlegameScore, self.endgameScore, self.gamePhase) == self.computeEvaluationTerms(), \
+                "incremental evaluation out of sync"
+    '''
+    Pass the turn without moving, for null move pruning in the search. Only the side to move, the en passant square and
+    the zobrist key change; the move log doesn't record it, so it has to be taken back with undoNullMove before the
+    move before it is undone
+    '''
+    def makeNullMove(self):
+        key = self.zobristKey ^ zobristBlackToMoveKey ^ self.enpassantKey()
+        self.enpassantPossible = ()
+        self.enpassantPossibleLog.append(self.enpassantPossible)
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+
+    def undoNullMove(self):
+        self.whiteToMove = not self.whiteToMove
+        self.enpassantPossibleLog.pop()
+        self.enpassantPossible = self.enpassantPossibleLog[-1]
+        self.zobristKeyLog.pop()
+        self.zobristKey = self.zobristKeyLog[-1]
+        self.checkmate = False
+        self.stalemate = False
+
     '''
     Undo last move made
     '''
     def undoMove(self):
         if len(self.moveLog) != 0: #check if there's a move to undo
             move = self.moveLog.pop()
+            self.updateEvaluationTerms(move, -1)
+            if move.pieceCaptured != "--":
+                self.pieceCounts[move.pieceCaptured[0]] += 1
             self.board[move.startRow][move.startCol] = move.pieceMoved
             self.board[move.endRow][move.endCol] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove #switch player turns
@@ -101,6 +315,12 @@ class GameState():
                 self.board[move.startRow][move.endCol] = move.pieceCaptured #puts enemy pawn back on square it got captured
             self.enpassantPossibleLog.pop()
             self.enpassantPossible = self.enpassantPossibleLog[-1]
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if not self.whiteToMove: #taking back a black move
+                self.fullmoveNumber -= 1
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
             #give back castle rights if move took them away
             self.castleRightsLog.pop()
             castleRights = self.castleRightsLog[-1]
@@ -120,6 +340,117 @@ class GameState():
 
             self.checkmate = False
             self.stalemate = False
+            if DEBUG_EVAL:
+                assert (self.middlegameScore, self.endgameScore, self.gamePhase) == self.computeEvaluationTerms(), \
+                    "incremental evaluation out of sync"
+
+    '''
+    Apply (sign 1) or take back (sign -1) the evaluation changes of a move. Called while the board holds the position
+    after the move, so the piece on the end square is the promoted piece for promotions
+    '''
+    def updateEvaluationTerms(self, move, sign):
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        placedPiece = self.board[move.endRow][move.endCol]
+        middlegame = middlegameScores[placedPiece][endSq] - middlegameScores[move.pieceMoved][startSq]
+        endgame = endgameScores[placedPiece][endSq] - endgameScores[move.pieceMoved][startSq]
+        phase = piecePhase[placedPiece] - piecePhase[move.pieceMoved]
+        if move.pieceCaptured != "--":
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            middlegame -= middlegameScores[move.pieceCaptured][capturedSq]
+            endgame -= endgameScores[move.pieceCaptured][capturedSq]
+            phase -= piecePhase[move.pieceCaptured]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2: #kingside
+                rookStart, rookEnd = endSq + 1, endSq - 1
+            else: #queenside
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            middlegame += middlegameScores[rook][rookEnd] - middlegameScores[rook][rookStart]
+            endgame += endgameScores[rook][rookEnd] - endgameScores[rook][rookStart]
+        self.middlegameScore += sign * middlegame
+        self.endgameScore += sign * endgame
+        self.gamePhase += sign * phase
+
+    '''
+    Middlegame score, endgame score and game phase of the board computed from scratch
+    '''
+    def computeEvaluationTerms(self):
+        middlegame = endgame = phase = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                middlegame += middlegameScores[piece][r * 8 + c]
+                endgame += endgameScores[piece][r * 8 + c]
+                phase += piecePhase[piece]
+        return middlegame, endgame, phase
+
+    '''
+    Number of pieces other than the kings of each colour, counted from scratch
+    '''
+    def countPieces(self):
+        counts = {'w': 0, 'b': 0}
+        for row in self.board:
+            for piece in row:
+                if piece != "--" and piece[1] != 'K':
+                    counts[piece[0]] += 1
+        return counts
+
+    '''
+    Zobrist key component for the current castling rights
+    '''
+    def castleRightsKey(self):
+        key = 0
+        if self.whiteCastleKingside:
+            key ^= zobristCastleKeys[0]
+        if self.blackCastleKingside:
+            key ^= zobristCastleKeys[1]
+        if self.whiteCastleQueenside:
+            key ^= zobristCastleKeys[2]
+        if self.blackCastleQueenside:
+            key ^= zobristCastleKeys[3]
+        return key
+
+    '''
+    Zobrist key component for the en passant square. Like in Polyglot keys, the file only counts when a pawn of the side
+    to move stands next to the pawn that moved two squares, so positions that only differ by an en passant capture
+    nobody can make get the same key and repetitions are found
+    '''
+    def enpassantKey(self):
+        if self.enpassantPossible == ():
+            return 0
+        row, col = self.enpassantPossible
+        pawn, pawnRow = ("wp", row + 1) if self.whiteToMove else ("bp", row - 1)
+        if (col > 0 and self.board[pawnRow][col - 1] == pawn) or (col < 7 and self.board[pawnRow][col + 1] == pawn):
+            return zobristEnpassantKeys[col]
+        return 0
+
+    '''
+    Compute the zobrist key of the current position from scratch. Used to initialise and verify the incremental key
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    key ^= zobristPieceKeys[piece][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMoveKey
+        key ^= self.castleRightsKey() ^ self.enpassantKey()
+        return key
+
+    '''
+    Build the move object for a packed moveID (see Move) in the current position
+    '''
+    def moveFromID(self, moveID):
+        startRow, startCol = divmod(moveID & 63, 8)
+        endRow, endCol = divmod(moveID >> 6 & 63, 8)
+        pieceMoved = self.board[startRow][startCol]
+        isEnpassantMove = pieceMoved[1] == 'p' and startCol != endCol and self.board[endRow][endCol] == "--"
+        isCastleMove = pieceMoved[1] == 'K' and abs(endCol - startCol) == 2
+        return Move((startRow, startCol), (endRow, endCol), self.board, isEnpassantMove=isEnpassantMove,
+                    isCastleMove=isCastleMove, promotionChoice=Move.promotionPieces[moveID >> 12 & 3])
 
     '''
     Update the castle rights given the move
@@ -171,28 +502,8 @@ class GameState():
             kingRow = self.blackKingLocation[0]
             kingCol = self.blackKingLocation[1]
         if self.inCheck:
-            if len(self.checks) == 1: #only 1 check, block check or move king
-                moves = self.getAllPossibleMoves()
-                #to block a check you must move a piece into one of the squares between the enemy piece and king
-                check = self.checks[0] #check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol] #enemy piece causing the check
-                validSquares = [] #squares that pieces can move to
-                #if knight, must capture knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8): #list of coords where pieces can move to block the check
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) #check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: #once you get to piece, finish checking
-                            break
-                #get rid of any moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1): #go through backwards when removing from a list by iteration
-                    if moves[i].pieceMoved[1] != 'K': #move doesn't move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: #move doesn't block check or capture piece
-                            moves.remove(moves[i])
+            if len(self.checks) == 1: #only 1 check, block check, capture the checking piece or move king
+                moves = self.getEvasionMoves(kingRow, kingCol, self.checks[0])
             else: #double check, king has to move
                 self.getKingMoves(kingRow, kingCol, moves)
         else: #not in check so all moves are fine
@@ -208,6 +519,61 @@ class GameState():
             self.stalemate = False
         return moves
 
+    '''
+    Legal moves out of a single check: king moves, then moves of the other pieces to the squares between the king and
+    the checking piece or onto the checking piece, generated from those squares. Pinned pieces can't get out of a
+    check, so they are skipped. Uses the pins found by checkForPinsAndChecks
+    '''
+    def getEvasionMoves(self, kingRow, kingCol, check):
+        moves = []
+        self.getKingMoves(kingRow, kingCol, moves)
+        board = self.board
+        checkRow, checkCol, dr, dc = check
+        allyColour = "w" if self.whiteToMove else "b"
+        forward = -1 if self.whiteToMove else 1
+        pinned = set((pin[0], pin[1]) for pin in self.pins)
+        #target squares: the checking piece, and for sliders the squares between it and the king
+        targets = [(checkRow, checkCol)]
+        if board[checkRow][checkCol][1] in "RBQ":
+            distance = max(abs(checkRow - kingRow), abs(checkCol - kingCol))
+            targets.extend((kingRow + dr * i, kingCol + dc * i) for i in range(1, distance))
+        for targetRow, targetCol in targets:
+            isCapture = targetRow == checkRow and targetCol == checkCol
+            #sliders on the rays through the target square
+            for j, ray in enumerate(rays[targetRow][targetCol]):
+                for r, c in ray:
+                    piece = board[r][c]
+                    if piece == "--":
+                        continue
+                    if piece[0] == allyColour and (piece[1] == 'Q' or piece[1] == ('R' if j <= 3 else 'B')) and \
+                            (r, c) not in pinned:
+                        moves.append(Move((r, c), (targetRow, targetCol), board))
+                    break
+            for r, c, offsetRow, offsetCol in knightTargets[targetRow][targetCol]:
+                if board[r][c] == allyColour + 'N' and (r, c) not in pinned:
+                    moves.append(Move((r, c), (targetRow, targetCol), board))
+            #pawns capture onto the checking piece and push onto empty squares
+            if isCapture:
+                for r, c, offsetRow, offsetCol in pawnAttackers[allyColour][targetRow][targetCol]:
+                    if board[r][c] == allyColour + 'p' and (r, c) not in pinned:
+                        self.addPawnMove((r, c), (targetRow, targetCol), moves)
+            else:
+                r = targetRow - forward
+                if 0 <= r < 8:
+                    if board[r][targetCol] == allyColour + 'p':
+                        if (r, targetCol) not in pinned:
+                            self.addPawnMove((r, targetCol), (targetRow, targetCol), moves)
+                    elif board[r][targetCol] == "--" and targetRow == (4 if self.whiteToMove else 3) and \
+                            board[r - forward][targetCol] == allyColour + 'p' and (r - forward, targetCol) not in pinned:
+                        moves.append(Move((r - forward, targetCol), (targetRow, targetCol), board))
+        #en passant can capture a checking pawn or block on the en passant square, enpassantIsSafe decides
+        if self.enpassantPossible != ():
+            endRow, endCol = self.enpassantPossible
+            for r, c, offsetRow, offsetCol in pawnAttackers[allyColour][endRow][endCol]:
+                if board[r][c] == allyColour + 'p' and (r, c) not in pinned and self.enpassantIsSafe(r, c, endCol):
+                    moves.append(Move((r, c), (endRow, endCol), board, isEnpassantMove=True))
+        return moves
+
     '''
     Returns if the player is in check, a list of pins, and a list of checks
     '''
@@ -226,53 +592,41 @@ class GameState():
             startRow = self.blackKingLocation[0]
             startCol = self.blackKingLocation[1]
         #check outward from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
+        board = self.board
+        for j, ray in enumerate(rays[startRow][startCol]):
             possiblePin = () #reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColour and endPiece[1] != 'K':
-                        if possiblePin == (): #1st allied piece could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else: #2nd allied piece, so no pin or check possible in this direction
-                            break
-                    elif endPiece[0] == enemyColour:
-                        type = endPiece[1]
-                        #5 possibilities here in this complex conditional
-                        #1) orthogonally away from king and piece is a rook
-                        #2) diagonally away from king and piece is a bishop
-                        #3) 1 square away diagonally from king and piece is a pawn
-                        #4) any direction and piece is a queen
-                        #5) any direction 1 square away and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'p' and ((enemyColour == 'w' and 6 <= j <= 7) or (enemyColour == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            if possiblePin == (): #no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else: #piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else: #enemy piece not applying check
-                            break
-                else:
-                    break #off board
-        #check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0]
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColour and endPiece[1] == 'N': #enemy knight attacking king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+            for i, (endRow, endCol) in enumerate(ray, 1):
+                endPiece = board[endRow][endCol]
+                if endPiece[0] == allyColour and endPiece[1] != 'K':
+                    if possiblePin == (): #1st allied piece could be pinned
+                        possiblePin = (endRow, endCol) + DIRECTIONS[j]
+                    else: #2nd allied piece, so no pin or check possible in this direction
+                        break
+                elif endPiece[0] == enemyColour:
+                    type = endPiece[1]
+                    #4 possibilities here in this complex conditional, pawns are checked with the pawnAttackers table
+                    #1) orthogonally away from king and piece is a rook
+                    #2) diagonally away from king and piece is a bishop
+                    #3) any direction and piece is a queen
+                    #4) any direction 1 square away and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
+                    if (j <= 3 and type == 'R') or (j >= 4 and type == 'B') or type == 'Q' or (i == 1 and type == 'K'):
+                        if possiblePin == (): #no piece blocking, so check
+                            inCheck = True
+                            checks.append((endRow, endCol) + DIRECTIONS[j])
+                        else: #piece blocking so pin
+                            pins.append(possiblePin)
+                    break #enemy piece not applying check blocks the ray
+        #check for knight and pawn checks
+        enemyKnight = enemyColour + 'N'
+        for endRow, endCol, dr, dc in knightTargets[startRow][startCol]:
+            if board[endRow][endCol] == enemyKnight: #enemy knight attacking king
+                inCheck = True
+                checks.append((endRow, endCol, dr, dc))
+        enemyPawn = enemyColour + 'p'
+        for endRow, endCol, dr, dc in pawnAttackers[enemyColour][startRow][startCol]:
+            if board[endRow][endCol] == enemyPawn:
+                inCheck = True
+                checks.append((endRow, endCol, dr, dc))
         return inCheck, pins, checks
 
     '''
@@ -290,62 +644,123 @@ class GameState():
     def squareUnderAttack(self, r, c, allyColour):
         #check outward from square
         enemyColour = 'w' if allyColour == 'b' else 'b'
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColour: #no attack from that direction
-                        break
-                    elif endPiece[0] == enemyColour:
-                        type = endPiece[1]
-                        #5 possibilities here in this complex conditional
-                        #1) orthogonally away from king and piece is a rook
-                        #2) diagonally away from king and piece is a bishop
-                        #3) 1 square away diagonally from king and piece is a pawn
-                        #4) any direction and piece is a queen
-                        #5) any direction 1 square away and piece is a king (this is necessary to prevent a king move to a square controlled by another king)
-                        if (0 <= j <= 3 and type == 'R') or \
-                                (4 <= j <= 7 and type == 'B') or \
-                                (i == 1 and type == 'p' and ((enemyColour == 'w' and 6 <= j <= 7) or (enemyColour == 'b' and 4 <= j <= 5))) or \
-                                (type == 'Q') or (i == 1 and type == 'K'):
-                            return True
-                        else: #enemy piece not applying check:
-                            break
-                    else:
-                        break #off board
-            #check for knight checks
-            knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-            for m in knightMoves:
-                endRow = r + m[0]
-                endCol = c + m[1]
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == enemyColour and endPiece[1] == 'N': #enemy knight attacking king
+        board = self.board
+        for j, ray in enumerate(rays[r][c]):
+            for i, (endRow, endCol) in enumerate(ray, 1):
+                endPiece = board[endRow][endCol]
+                if endPiece == "--":
+                    continue
+                if endPiece[0] == enemyColour:
+                    type = endPiece[1]
+                    #same conditions as in checkForPinsAndChecks
+                    if (j <= 3 and type == 'R') or (j >= 4 and type == 'B') or type == 'Q' or (i == 1 and type == 'K'):
                         return True
+                break #no attack from that direction
+        #check for knight and pawn attacks
+        enemyKnight = enemyColour + 'N'
+        for endRow, endCol, dr, dc in knightTargets[r][c]:
+            if board[endRow][endCol] == enemyKnight:
+                return True
+        enemyPawn = enemyColour + 'p'
+        for endRow, endCol, dr, dc in pawnAttackers[enemyColour][r][c]:
+            if board[endRow][endCol] == enemyPawn:
+                return True
+        return False
+
+    '''
+    Legal moves generated lazily in stages for the search: the hash move, captures that win material or trade evenly
+    (most valuable victim first), killer moves, losing captures, then quiet moves ordered by quietScore.
+    A stage is only generated once the search has used up the stages before it.
+    The pins and checks found by checkForPinsAndChecks are kept for all stages, so every move yielded is legal.
+    When in check all the evasions are generated at once
+    '''
+    def getStagedMoves(self, hashMoveID=None, killerIDs=(), quietScore=None):
+        self.inCheck, pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            moves = self.getValidMoves()
+            moves.sort(key=lambda move: move.moveID != hashMoveID) #hash move first
+            yield from moves
+            return
+
+        yieldedIDs = []
+        if hashMoveID is not None:
+            move = self.getPieceMove(hashMoveID, pins)
+            if move is not None:
+                yieldedIDs.append(hashMoveID)
+                yield move
+
+        self.pins = list(pins) #the piece move functions remove the pins they use
+        captures = self.getAllPossibleMoves(capturesOnly=True)
+        captures.sort(key=captureGain, reverse=True)
+        losingCaptures = []
+        for move in captures:
+            if move.moveID in yieldedIDs:
+                continue
+            if captureGain(move) >= pieceScore[move.pieceMoved[1]]:
+                yield move
+            else:
+                losingCaptures.append(move)
+
+        for killerID in killerIDs:
+            if killerID is not None and killerID not in yieldedIDs:
+                move = self.getPieceMove(killerID, pins)
+                if move is not None and not move.isCapture and not move.pawnPromotion:
+                    yieldedIDs.append(killerID)
+                    yield move
+
+        yield from losingCaptures
+
+        self.pins = list(pins)
+        quietMoves = [move for move in self.getAllPossibleMoves()
+                      if not move.isCapture and not move.pawnPromotion and move.moveID not in yieldedIDs]
+        if quietScore is not None:
+            quietMoves.sort(key=quietScore, reverse=True)
+        yield from quietMoves
 
-            return False
+    '''
+    Find the legal move with the given moveID by generating the moves of the piece on its start square only.
+    Returns None if there is no such move. Only valid when the player is not in check
+    '''
+    def getPieceMove(self, moveID, pins):
+        startRow, startCol = divmod(moveID & 63, 8)
+        piece = self.board[startRow][startCol]
+        if piece[0] != ('w' if self.whiteToMove else 'b'):
+            return None
+        pieceMoves = []
+        self.pins = list(pins)
+        self.moveFunctions[piece[1]](startRow, startCol, pieceMoves)
+        for move in pieceMoves:
+            if move.moveID == moveID:
+                return move
+        return None
+
+    '''
+    Captures and pawn promotions only, considering checks. Used by the quiescence search.
+    If the player is in check all the moves getting out of check are returned
+    '''
+    def getCaptureMoves(self):
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return self.getValidMoves()
+        return self.getAllPossibleMoves(capturesOnly=True)
 
     '''
     All moves without considering checks
     '''
-    def getAllPossibleMoves(self):
+    def getAllPossibleMoves(self, capturesOnly=False):
         moves = []
         for r in range(len(self.board)): #number of rows
             for c in range(len(self.board[r])): #number of cols in a row
                 turn = self.board[r][c][0]
                 if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
                     piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves) #calls the appropriate move function based on piece type
+                    self.moveFunctions[piece](r, c, moves, capturesOnly) #calls the appropriate move function based on piece type
         return moves
 
     '''
     Get all the pawn moves for the pawn located at row, col and add these moves to the list
     '''
-    def getPawnMoves(self, r, c, moves):
+    def getPawnMoves(self, r, c, moves, capturesOnly=False):
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins)-1, -1, -1):
@@ -365,28 +780,52 @@ class GameState():
             enemyColour = 'w'
 
         if self.board[r+moveAmount][c] == "--": #1 square move
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                moves.append(Move((r, c), (r+moveAmount, c), self.board))
-                if r == startRow and self.board[r+2*moveAmount][c] == "--":  # 2 square move
+            if (not piecePinned or pinDirection == (moveAmount, 0) or pinDirection == (-moveAmount, 0)) and \
+                    (not capturesOnly or r + moveAmount == 0 or r + moveAmount == 7): #promotions are kept with the captures
+                self.addPawnMove((r, c), (r+moveAmount, c), moves)
+                if not capturesOnly and r == startRow and self.board[r+2*moveAmount][c] == "--":  # 2 square move
                     moves.append(Move((r, c), (r+2*moveAmount, c), self.board))
-        #captures
-        if c-1 >= 0: #capture to the left
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[r + moveAmount][c - 1][0] == enemyColour:
-                    moves.append(Move((r, c), (r+moveAmount, c-1), self.board))
-                if (r + moveAmount, c - 1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r+moveAmount, c-1), self.board, isEnpassantMove=True))
-        if c+1 <= 7: #capture to the right
-            if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[r + moveAmount][c + 1][0] == enemyColour:
-                    moves.append(Move((r, c), (r+moveAmount, c+1), self.board))
-                if (r + moveAmount, c + 1) == self.enpassantPossible:
-                    moves.append(Move((r, c), (r+moveAmount, c+1), self.board, isEnpassantMove=True))
+        #captures, to the left then to the right
+        for endRow, endCol, dr, dc in pawnCaptureTargets[self.board[r][c][0]][r][c]:
+            if not piecePinned or pinDirection == (dr, dc):
+                if self.board[endRow][endCol][0] == enemyColour:
+                    self.addPawnMove((r, c), (endRow, endCol), moves)
+                if (endRow, endCol) == self.enpassantPossible and self.enpassantIsSafe(r, c, endCol):
+                    moves.append(Move((r, c), (endRow, endCol), self.board, isEnpassantMove=True))
+
+    '''
+    Add a pawn move to the list, or one move per promotion piece if the pawn reaches the last row
+    '''
+    def addPawnMove(self, startSq, endSq, moves):
+        if endSq[0] == 0 or endSq[0] == 7:
+            for promotionChoice in Move.promotionPieces:
+                moves.append(Move(startSq, endSq, self.board, promotionChoice=promotionChoice))
+        else:
+            moves.append(Move(startSq, endSq, self.board))
+
+    '''
+    En passant removes two pawns from the same row, which can expose the king in ways the pin check doesn't see.
+    Play the capture on the board and check that the king is not attacked
+    '''
+    def enpassantIsSafe(self, r, c, endCol):
+        allyColour = "w" if self.whiteToMove else "b"
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        endRow = self.enpassantPossible[0]
+        pawn = self.board[r][c]
+        capturedPawn = self.board[r][endCol]
+        self.board[r][c] = "--"
+        self.board[r][endCol] = "--"
+        self.board[endRow][endCol] = pawn
+        safe = not self.squareUnderAttack(kingRow, kingCol, allyColour)
+        self.board[r][c] = pawn
+        self.board[r][endCol] = capturedPawn
+        self.board[endRow][endCol] = "--"
+        return safe
 
     '''
     Get all the rook moves for the rook located at row, col and add these moves to the list
     '''
-    def getRookMoves(self, r, c, moves):
+    def getRookMoves(self, r, c, moves, capturesOnly=False):
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -396,50 +835,53 @@ class GameState():
                 if self.board[r][c][1] != 'Q': #can't remove queen from pin on rook moves, only remove it on bishop moves
                     self.pins.remove(self.pins[i])
                 break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) #up, left, down, right
+        self.getSliderMoves(r, c, moves, capturesOnly, 0, piecePinned, pinDirection) #up, left, down, right
+
+    '''
+    Add the moves along the rays of the four directions starting at DIRECTIONS[firstDirection] (0 for rooks, 4 for
+    bishops). A pinned piece only moves along its pin
+    '''
+    def getSliderMoves(self, r, c, moves, capturesOnly, firstDirection, piecePinned, pinDirection):
         enemyColour = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--": #empty space; valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColour: #enemy piece; valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else: #friendly piece; invalid
-                            break
-                else: #out of bounds; off the board
+        board = self.board
+        squareRays = rays[r][c]
+        for j in range(firstDirection, firstDirection + 4):
+            d = DIRECTIONS[j]
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
+            for endRow, endCol in squareRays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece == "--": #empty space; valid
+                    if not capturesOnly:
+                        moves.append(Move((r, c), (endRow, endCol), board))
+                elif endPiece[0] == enemyColour: #enemy piece; valid
+                    moves.append(Move((r, c), (endRow, endCol), board))
+                    break
+                else: #friendly piece; invalid
                     break
 
     '''
     Get all the knight moves for the knight located at row, col and add these moves to the list
     '''
-    def getKnightMoves(self, r, c, moves):
+    def getKnightMoves(self, r, c, moves, capturesOnly=False):
         piecePinned = False
         for i in range(len(self.pins) - 1, -1, -1):
             if self.pins[i][0] == r and self.pins[i][1] == c:
                 piecePinned = True
                 self.pins.remove(self.pins[i])
                 break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        if piecePinned:
+            return
         allyColour = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColour: #not an ally piece (empty or enemy piece)
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+        for endRow, endCol, dr, dc in knightTargets[r][c]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] != allyColour and (not capturesOnly or endPiece != "--"): #not an ally piece (empty or enemy piece)
+                moves.append(Move((r, c), (endRow, endCol), self.board))
 
     '''
     Get all the bishop moves for the bishop located at row, col and add these moves to the list
     '''
-    def getBishopMoves(self, r, c, moves):
+    def getBishopMoves(self, r, c, moves, capturesOnly=False):
         piecePinned = False
         pinDirection = ()
         for i in range(len(self.pins) - 1, -1, -1):
@@ -448,59 +890,38 @@ class GameState():
                 pinDirection = (self.pins[i][2], self.pins[i][3])
                 self.pins.remove(self.pins[i])
                 break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1)) #top left, top right, bottom left, bottom right
-        enemyColour = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: #on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--": #empty space; valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColour: #enemy piece; valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else: #friendly piece; invalid
-                            break
-                else: #out of bounds; off the board
-                    break
+        self.getSliderMoves(r, c, moves, capturesOnly, 4, piecePinned, pinDirection) #top left, top right, bottom left, bottom right
 
     '''
     Get all the queen moves for the queen located at row, col and add these moves to the list
     '''
-    def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+    def getQueenMoves(self, r, c, moves, capturesOnly=False):
+        self.getRookMoves(r, c, moves, capturesOnly)
+        self.getBishopMoves(r, c, moves, capturesOnly)
 
     '''
     Get all the king moves for the king located at row, col and add these moves to the list
     '''
-    def getKingMoves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
+    def getKingMoves(self, r, c, moves, capturesOnly=False):
         allyColour = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColour: #not an ally piece (empty or enemy piece)
-                    # place king on end square and check for checks
-                    if allyColour == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    # place king back on original position
-                    if allyColour == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
-        self.getCastleMoves(r, c, moves, allyColour)
+        for endRow, endCol, dr, dc in kingTargets[r][c]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] != allyColour and (not capturesOnly or endPiece != "--"): #not an ally piece (empty or enemy piece)
+                # place king on end square and check for checks
+                if allyColour == 'w':
+                    self.whiteKingLocation = (endRow, endCol)
+                else:
+                    self.blackKingLocation = (endRow, endCol)
+                inCheck, pins, checks = self.checkForPinsAndChecks()
+                if not inCheck:
+                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                # place king back on original position
+                if allyColour == 'w':
+                    self.whiteKingLocation = (r, c)
+                else:
+                    self.blackKingLocation = (r, c)
+        if not capturesOnly:
+            self.getCastleMoves(r, c, moves, allyColour)
 
     '''
     Generate all valid castle moves for the king at (r, c) and add them to the list of moves
@@ -508,7 +929,6 @@ class GameState():
     def getCastleMoves(self, r, c, moves, allyColour):
         inCheck = self.squareUnderAttack(r, c, allyColour)
         if inCheck:
-            print("oof")
             return #can't castle if in check
         if (self.whiteToMove and self.whiteCastleKingside) or (not self.whiteToMove and self.blackCastleKingside): #can't castle if given up rights
             self.getKingsideCastleMoves(r, c, moves, allyColour)
@@ -533,6 +953,15 @@ class GameState():
             not self.squareUnderAttack(r, c-1, allyColour) and not self.squareUnderAttack(r, c-2, allyColour):
                 moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
 
+'''
+Material won by a capture or promotion, used to order and split the capture stage of GameState.getStagedMoves
+'''
+def captureGain(move):
+    gain = pieceScore[move.pieceCaptured[1]] if move.isCapture else 0
+    if move.pawnPromotion:
+        gain += pieceScore[move.promotionChoice] - pieceScore['p']
+    return gain
+
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -549,8 +978,12 @@ class Move():
     filesToCols = {"a": 0, "b": 1, "c": 2, "d": 3,
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v:k for k, v in filesToCols.items()}
+    promotionPieces = ('Q', 'R', 'B', 'N')
+    #no per instance __dict__, the search creates a very large number of moves
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isEnpassantMove',
+                 'pawnPromotion', 'isCastleMove', 'promotionChoice', 'isCapture', 'moveID')
 
-    def __init__(self, startSq, endSq, board, isEnpassantMove=False, pawnPromotion=False, isCastleMove=False):
+    def __init__(self, startSq, endSq, board, isEnpassantMove=False, pawnPromotion=False, isCastleMove=False, promotionChoice='Q'):
         self.startRow = startSq[0]
         self.startCol = startSq[1]
         self.endRow = endSq[0]
@@ -558,13 +991,18 @@ class Move():
         self.pieceMoved = board[self.startRow][self.startCol]
         self.pieceCaptured = board[self.endRow][self.endCol]
         self.isEnpassantMove = isEnpassantMove
-        self.pawnPromotion = pawnPromotion
         self.pawnPromotion = self.pieceMoved[1] == 'p' and (self.endRow == 0 or self.endRow == 7)
         self.isCastleMove = isCastleMove
+        self.promotionChoice = promotionChoice #piece type the pawn turns into, only used if pawnPromotion
         if self.isEnpassantMove:
             self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
         self.isCapture = self.pieceCaptured != '--'
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        #the move packed into one int: bits 0-5 start square, bits 6-11 end square (row * 8 + col) and bits 12-13 the
+        #promotion piece. Queen promotions pack as 0, so a move built from two clicks matches them.
+        #En passant and castling follow from the position, see GameState.moveFromID
+        self.moveID = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.pawnPromotion:
+            self.moveID |= self.promotionPieces.index(promotionChoice) << 12
 
     '''
     Overriding the equals method
@@ -574,9 +1012,15 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
     def getChessNotation(self):
         # attempt to make proper chess notation
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.pawnPromotion:
+            notation += self.promotionChoice.lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
@@ -591,10 +1035,13 @@ class Move():
         #pawn moves
         if self.pieceMoved[1] == 'p':
             if self.isCapture:
-                return self.colsToFiles[self.startCol] + "x" + endSquare
+                moveString = self.colsToFiles[self.startCol] + "x" + endSquare
             else:
-                return endSquare
+                moveString = endSquare
             #pawn promotions
+            if self.pawnPromotion:
+                moveString += "=" + self.promotionChoice
+            return moveString
 
         #two of the same type of piece moving to a square, e.g. Nbd2 if both knights can move to d2
 
@@ -0,0 +1,107 @@
+'''
+Evaluation tables. GameState keeps the evaluation as running totals built from these, ChessAI scores positions with them.
+Scores are in centipawns, positive is good for white. The middlegame and endgame scores are blended by the game phase,
+which counts down from MAX_PHASE as pieces come off the board
+'''
+pieceScore = {"K": 0, "Q": 900, "R": 500, "B": 330, "N": 320, "p": 100}
+phaseWeight = {"K": 0, "Q": 4, "R": 2, "B": 1, "N": 1, "p": 0}
+MAX_PHASE = 24 #phase of the start position: 4 knights, 4 bishops, 4 rooks and 2 queens
+
+#piece-square tables for white pieces. Indexed row * 8 + col with row 0 the 8th rank, the same layout as GameState.board
+middlegameTables = {
+    'p': [0, 0, 0, 0, 0, 0, 0, 0,
+          50, 50, 50, 50, 50, 50, 50, 50,
+          10, 10, 20, 30, 30, 20, 10, 10,
+          5, 5, 10, 25, 25, 10, 5, 5,
+          0, 0, 0, 20, 20, 0, 0, 0,
+          5, -5, -10, 0, 0, -10, -5, 5,
+          5, 10, 10, -20, -20, 10, 10, 5,
+          0, 0, 0, 0, 0, 0, 0, 0],
+    'N': [-50, -40, -30, -30, -30, -30, -40, -50,
+          -40, -20, 0, 0, 0, 0, -20, -40,
+          -30, 0, 10, 15, 15, 10, 0, -30,
+          -30, 5, 15, 20, 20, 15, 5, -30,
+          -30, 0, 15, 20, 20, 15, 0, -30,
+          -30, 5, 10, 15, 15, 10, 5, -30,
+          -40, -20, 0, 5, 5, 0, -20, -40,
+          -50, -40, -30, -30, -30, -30, -40, -50],
+    'B': [-20, -10, -10, -10, -10, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 10, 10, 5, 0, -10,
+          -10, 5, 5, 10, 10, 5, 5, -10,
+          -10, 0, 10, 10, 10, 10, 0, -10,
+          -10, 10, 10, 10, 10, 10, 10, -10,
+          -10, 5, 0, 0, 0, 0, 5, -10,
+          -20, -10, -10, -10, -10, -10, -10, -20],
+    'R': [0, 0, 0, 0, 0, 0, 0, 0,
+          5, 10, 10, 10, 10, 10, 10, 5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          -5, 0, 0, 0, 0, 0, 0, -5,
+          0, 0, 0, 5, 5, 0, 0, 0],
+    'Q': [-20, -10, -10, -5, -5, -10, -10, -20,
+          -10, 0, 0, 0, 0, 0, 0, -10,
+          -10, 0, 5, 5, 5, 5, 0, -10,
+          -5, 0, 5, 5, 5, 5, 0, -5,
+          0, 0, 5, 5, 5, 5, 0, -5,
+          -10, 5, 5, 5, 5, 5, 0, -10,
+          -10, 0, 5, 0, 0, 0, 0, -10,
+          -20, -10, -10, -5, -5, -10, -10, -20],
+    'K': [-30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -30, -40, -40, -50, -50, -40, -40, -30,
+          -20, -30, -30, -40, -40, -30, -30, -20,
+          -10, -20, -20, -20, -20, -20, -20, -10,
+          20, 20, 0, 0, 0, 0, 20, 20,
+          20, 30, 10, 0, 0, 10, 30, 20],
+}
+
+#in the endgame pawns race to promote and the king comes to the centre, the other pieces keep their middlegame tables
+endgameTables = dict(middlegameTables)
+endgameTables['p'] = [0] * 8 + [80] * 8 + [50] * 8 + [30] * 8 + [20] * 8 + [10] * 8 + [0] * 8 + [0] * 8
+endgameTables['K'] = [-50, -40, -30, -20, -20, -30, -40, -50,
+                      -30, -20, -10, 0, 0, -10, -20, -30,
+                      -30, -10, 20, 30, 30, 20, -10, -30,
+                      -30, -10, 30, 40, 40, 30, -10, -30,
+                      -30, -10, 30, 40, 40, 30, -10, -30,
+                      -30, -10, 20, 30, 30, 20, -10, -30,
+                      -30, -30, 0, 0, 0, 0, -30, -30,
+                      -50, -30, -30, -30, -30, -30, -30, -50]
+
+'''
+Material plus piece-square score of every piece on every square from white's point of view.
+Black pieces use the white table mirrored top to bottom and count negative
+'''
+def buildPieceSquareScores(tables):
+    scores = {"--": [0] * 64}
+    for piece, table in tables.items():
+        scores['w' + piece] = [pieceScore[piece] + table[sq] for sq in range(64)]
+        scores['b' + piece] = [-(pieceScore[piece] + table[(7 - sq // 8) * 8 + sq % 8]) for sq in range(64)]
+    return scores
+
+middlegameScores = buildPieceSquareScores(middlegameTables)
+endgameScores = buildPieceSquareScores(endgameTables)
+piecePhase = {"--": 0}
+for piece, weight in phaseWeight.items():
+    piecePhase['w' + piece] = weight
+    piecePhase['b' + piece] = weight
+
+'''
+Blend the middlegame and endgame scores by the game phase. Phases above MAX_PHASE (after promotions) count as MAX_PHASE
+'''
+def taperedScore(middlegameScore, endgameScore, phase):
+    phase = min(phase, MAX_PHASE)
+    return (middlegameScore * phase + endgameScore * (MAX_PHASE - phase)) // MAX_PHASE
+
+#piece index used by the batch evaluator, 0 is an empty square
+PIECES = ("--", "wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+pieceIndex = {piece: i for i, piece in enumerate(PIECES)}
+
+'''
+The 64 piece indexes of a board, row by row. One row of the (N, 64) array taken by ChessAI.scoreBoards
+'''
+def encodeBoard(board):
+    return [pieceIndex[square] for row in board for square in row]
@@ -1,7 +1,11 @@
 # Main driver. Responsible  for handling user input and displaying current GameState object.
 
+import copy
+import os
+import threading
+import time
 import pygame as p
-import ChessEngine, ChessAI
+import ChessEngine, ChessAI, ChessBook, ChessTablebase
 
 BOARD_WIDTH = BOARD_HEIGHT = 512 #400 is also good
 MOVE_LOG_PANEL_WIDTH = 250
@@ -9,6 +13,9 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8 #dimensions of a chess board, 8x8
 SQ_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15 #for animations
+PONDER = True #search the predicted reply while the human is thinking
+BOOK_FILE = "book.bin" #Polyglot opening book the AI plays from when the file exists, see ChessBook
+TABLEBASE_DIR = "tablebases" #endgame tables the AI uses when the directory exists, see ChessTablebase
 IMAGES = {}
 
 '''
@@ -20,6 +27,68 @@ def loadImages():
         IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQ_SIZE, SQ_SIZE))
     #Note: An image is accessible by saying 'IMAGES["wp"]', for example.
 
+'''
+Runs the AI search on a copy of the game state in a background thread, so the window keeps drawing and handling events
+while the engine thinks. cancel() stops the search and waits for the thread to finish.
+When pondering, ponderMove is the predicted reply of the human and the search runs on the position after it with no
+depth limit, on the human's time, until ponderHit() or cancel()
+'''
+class AIThread():
+    def __init__(self, gs, ponderMove=None):
+        self.gs = copy.deepcopy(gs)
+        self.ponderMove = ponderMove
+        if ponderMove is not None:
+            self.gs.makeMove(self.gs.moveFromID(ponderMove.moveID))
+        self.cancelEvent = threading.Event()
+        self.bestMove = None
+        self.completedDepth = 0
+        self.startTime = time.perf_counter()
+        self.endTime = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        maxDepth = ChessAI.MAX_DEPTH if self.ponderMove is not None else None
+        self.bestMove = ChessAI.findBestMove(self.gs, self.gs.getValidMoves(), maxDepth, cancelEvent=self.cancelEvent,
+                                             onIteration=self.onIteration)
+        self.endTime = time.perf_counter()
+
+    def onIteration(self, depth, score, move, nodes):
+        self.completedDepth = depth
+        if self.ponderMove is None and depth >= ChessAI.DEPTH: #ponder hit earlier, the normal search depth is done
+            self.cancelEvent.set()
+
+    '''
+    The human played the predicted reply. The search goes on until it has finished the normal search depth, so it stops
+    straight away if pondering already got that far, and returns its deepest finished iteration
+    '''
+    def ponderHit(self):
+        self.ponderMove = None
+        if self.completedDepth >= ChessAI.DEPTH:
+            self.cancelEvent.set()
+
+    '''
+    Seconds spent searching so far, or in total once the search has finished
+    '''
+    def searchTime(self):
+        return (self.endTime or time.perf_counter()) - self.startTime
+
+    def isDone(self):
+        return not self.thread.is_alive()
+
+    def cancel(self):
+        self.cancelEvent.set()
+        self.thread.join()
+
+'''
+Print how often the predicted reply was played and how much search time that saved
+'''
+def printPonderStats(ponderStats):
+    predictions = ponderStats["hits"] + ponderStats["misses"]
+    if predictions > 0:
+        print("ponder hits: %d/%d (%.0f%%), %.2fs of thinking saved" % (ponderStats["hits"], predictions,
+              100.0 * ponderStats["hits"] / predictions, ponderStats["savedTime"]))
+
 '''
 Main driver for the code. Will handle user input and update graphics
 '''
@@ -29,7 +98,11 @@ def main():
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     moveLogFont = p.font.SysFont("Arial", 15, False, False)
-    gs = ChessEngine.GameState()
+    if os.path.exists(BOOK_FILE):
+        ChessAI.openingBook = ChessBook.OpeningBook(BOOK_FILE)
+    if os.path.isdir(TABLEBASE_DIR):
+        ChessAI.tablebases = ChessTablebase.Tablebases(TABLEBASE_DIR)
+    gs = ChessEngine.createGameState()
     validMoves = gs.getValidMoves()
     moveMade = False #flag variable for when a move is made
     animate = False #flag variable for when a move should be animated
@@ -40,10 +113,17 @@ def main():
     gameOver = False
     playerOne = True #If a Human is playing white, then this will be True. If an AI is playing, then false
     playerTwo = False #Same as above but for black
+    aiThread = None #search running in the background while the AI is thinking or pondering
+    ponderStats = {"hits": 0, "misses": 0, "savedTime": 0.0}
+    startPondering = False
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
             if e.type == p.QUIT:
+                if aiThread is not None:
+                    aiThread.cancel()
+                    aiThread = None
+                printPonderStats(ponderStats)
                 running = False
             #mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
@@ -63,6 +143,15 @@ def main():
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
+                                if aiThread is not None: #the AI was pondering on the predicted reply
+                                    if aiThread.ponderMove == validMoves[i]: #ponder hit, the search carries on
+                                        ponderStats["hits"] += 1
+                                        ponderStats["savedTime"] += aiThread.searchTime()
+                                        aiThread.ponderHit()
+                                    else: #ponder miss, drop the search
+                                        ponderStats["misses"] += 1
+                                        aiThread.cancel()
+                                        aiThread = None
                                 moveMade = True
                                 animate = True
                                 sqSelected = () #reset user clicks
@@ -71,13 +160,18 @@ def main():
                             playerClicks = [sqSelected]
             #key handlers
             elif e.type == p.KEYDOWN:
+                if (e.key == p.K_z or e.key == p.K_r) and aiThread is not None: #stop the AI before changing the board
+                    aiThread.cancel()
+                    aiThread = None
                 if e.key == p.K_z: #undo when 'z' is pressed
                     gs.undoMove()
                     moveMade = True
                     animate = False
                     gameOver = False
                 if e.key == p.K_r: #reset the board when 'r' is pressed
-                    gs = ChessEngine.GameState()
+                    printPonderStats(ponderStats)
+                    ponderStats = {"hits": 0, "misses": 0, "savedTime": 0.0}
+                    gs = ChessEngine.createGameState()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
@@ -86,24 +180,40 @@ def main():
                     gameOver = False
 
         #AI move finder
-        if not gameOver and not humanTurn:
-            AIMove = ChessAI.findBestMove(gs, validMoves)
-            if AIMove is None:
-                AIMove = ChessAI.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+        if running and not gameOver and not humanTurn:
+            if aiThread is None:
+                aiThread = AIThread(gs)
+            elif aiThread.isDone():
+                #the move was found on the copy of the game state, play the same move here
+                AIMove = next(move for move in validMoves if move == aiThread.bestMove)
+                aiThread = None
+                gs.makeMove(AIMove)
+                moveMade = True
+                animate = True
+                startPondering = PONDER
 
         if moveMade:
             if animate:
                 animateMove(gs.moveLog[-1], screen, gs.board, clock)
+            humanToMove = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+            if startPondering and humanToMove:
+                #the move after the AI move in the principal variation is the reply the AI expects
+                pv = ChessAI.getPrincipalVariation(gs, 1)
+                if len(pv) > 0:
+                    aiThread = AIThread(gs, pv[0])
+            startPondering = False
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
 
         drawGameState(screen, gs, validMoves, sqSelected, moveLogFont)
+        if aiThread is not None:
+            drawThinkingText(screen, "%s: depth %d, %d nodes" % ("thinking" if aiThread.ponderMove is None else "pondering",
+                             ChessAI.searchDepth, ChessAI.searchStats.nodes), moveLogFont)
 
         if gs.checkmate or gs.stalemate:
+            if not gameOver:
+                printPonderStats(ponderStats)
             gameOver = True
             drawEndGameText(screen, 'Stalemate' if gs.stalemate else 'Black wins by checkmate' if gs.whiteToMove else 'White wins by checkmate')
 
@@ -186,6 +296,14 @@ def drawMoveLog(screen, gs, font):
         screen.blit(textObject, textLocation)
         textY += textObject.get_height() + lineSpacing
 
+'''
+Draws the progress of the AI search at the bottom of the move log
+'''
+def drawThinkingText(screen, text, font):
+    textObject = font.render(text, True, p.Color('White'))
+    padding = 5
+    screen.blit(textObject, (BOARD_WIDTH + padding, MOVE_LOG_PANEL_HEIGHT - textObject.get_height() - padding))
+
 '''
 Animating a move
 '''
@@ -0,0 +1,272 @@
+# Self-play matches between two engine configurations. Plays game pairs from seeded openings (each opening once with
+# each colour) in worker processes, writes the games as PGN and reports the Elo difference with its 95% error bars and
+# a running SPRT (sequential probability ratio test) verdict.
+# Usage:
+#   python ChessMatch.py --engine name=new depth=3 --engine name=old depth=3 DELTA_MARGIN=100 --games 200 --workers 4
+#   python ChessMatch.py --engine tc=10+0.1 --engine tc=10+0.1 STAGED_MOVE_GENERATION=False --sprt 0 10 --pgn out.pgn
+# Engine settings: name, depth (fixed depth), time (seconds per move), nodes (nodes per move), tc (clock as
+# seconds+increment). Any other NAME=value overrides the ChessAI module global of that name for the engine's moves.
+
+import argparse
+import ast
+import math
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import ChessEngine, ChessAI, ChessPGN, ChessUCI
+
+MAX_PLIES = 400 #games still running after this many plies are adjudicated as draws
+RANDOM_OPENING_PLIES = 6 #random plies played from the start position when no openings file is given
+limitSettings = ("name", "depth", "time", "nodes", "tc")
+
+'''
+Engine configuration from NAME=value words. Values are read as Python literals where possible
+'''
+def parseEngine(words, number):
+    engine = {"name": "engine%d" % number, "options": {}}
+    for word in words:
+        if "=" not in word:
+            raise ValueError("engine settings are NAME=value, got " + word)
+        name, value = word.split("=", 1)
+        try:
+            value = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            pass
+        if name in limitSettings:
+            engine[name] = value
+        elif hasattr(ChessAI, name):
+            engine["options"][name] = value
+        else:
+            raise ValueError("ChessAI has no setting " + name)
+    if "tc" in engine:
+        base, increment = (str(engine["tc"]).split("+") + ["0"])[:2]
+        engine["tc"] = (float(base), float(increment))
+    if not any(limit in engine for limit in ("depth", "time", "nodes", "tc")):
+        engine["depth"] = ChessAI.DEPTH
+    return engine
+
+'''
+Openings as (FEN, coordinate moves) pairs. Read from a file of FEN/EPD lines when given, otherwise played as random
+plies from the start position with a seeded generator, so a seed always gives the same openings
+'''
+def makeOpenings(count, seed, path=None):
+    if path is not None:
+        with open(path) as f:
+            fens = [" ".join(line.split()[:6]) if len(line.split()) >= 6 and line.split()[4].isdigit()
+                    else " ".join(line.split()[:4]) for line in f if line.strip() and not line.startswith("#")]
+        for fen in fens:
+            ChessEngine.createGameState(fen=fen) #raises ValueError for a malformed FEN before any game starts
+        random.Random(seed).shuffle(fens)
+        return [(fens[i % len(fens)], []) for i in range(count)]
+    openings = []
+    for i in range(count):
+        rng = random.Random(seed * 1000003 + i)
+        while True:
+            gs = ChessEngine.createGameState()
+            moves = []
+            for ply in range(RANDOM_OPENING_PLIES):
+                validMoves = gs.getValidMoves()
+                if len(validMoves) == 0:
+                    break
+                move = validMoves[rng.randrange(len(validMoves))]
+                gs.makeMove(move)
+                moves.append(move.getChessNotation())
+            if len(moves) == RANDOM_OPENING_PLIES and len(gs.getValidMoves()) > 0:
+                break
+        openings.append((None, moves))
+    return openings
+
+'''
+Result and termination of the game in gs, or None while it goes on. validMoves are the legal moves of gs
+'''
+def gameOver(gs, validMoves):
+    if len(validMoves) == 0:
+        if gs.inCheck:
+            return ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if gs.halfmoveClock >= 100:
+        return "1/2-1/2", "50-move rule"
+    if gs.zobristKeyLog.count(gs.zobristKey) >= 3:
+        return "1/2-1/2", "threefold repetition"
+    pieces = [piece for row in gs.board for piece in row if piece != "--" and piece[1] != "K"]
+    if len(pieces) == 0 or (len(pieces) == 1 and pieces[0][1] in "NB"):
+        return "1/2-1/2", "insufficient material"
+    return None
+
+'''
+Runs in a worker process. Play one game and return (game number, engine 1 plays white, result, PGN headers, SAN moves,
+start side, start move number). Each engine has its own transposition table and ChessAI settings
+'''
+def playGame(task):
+    gameNumber, engines, engine1White, opening, maxPlies = task
+    startFEN, openingMoves = opening
+    white, black = (engines[0], engines[1]) if engine1White else (engines[1], engines[0])
+    defaults = {name: getattr(ChessAI, name) for engine in engines for name in engine["options"]}
+    tables = [ChessAI.TranspositionTable(), ChessAI.TranspositionTable()] #white, black
+    clocks = [white["tc"][0] if "tc" in white else None, black["tc"][0] if "tc" in black else None]
+
+    gs = ChessEngine.createGameState(fen=startFEN)
+    startWhiteToMove, startMoveNumber = gs.whiteToMove, gs.fullmoveNumber
+    sanMoves = []
+    for text in openingMoves:
+        validMoves = gs.getValidMoves()
+        move = next(move for move in validMoves if move.getChessNotation() == text)
+        sanMoves.append(ChessPGN.toSAN(gs, move, validMoves))
+        gs.makeMove(move)
+    outcome = None
+    while outcome is None:
+        validMoves = gs.getValidMoves()
+        outcome = gameOver(gs, validMoves)
+        if outcome is not None:
+            break
+        if len(sanMoves) >= maxPlies:
+            outcome = "1/2-1/2", "adjudicated after %d plies" % maxPlies
+            break
+        side = 0 if gs.whiteToMove else 1
+        engine = white if gs.whiteToMove else black
+        for name, value in defaults.items():
+            setattr(ChessAI, name, engine["options"].get(name, value))
+        ChessAI.transpositionTable = tables[side]
+        timeLimit = engine.get("time")
+        if clocks[side] is not None:
+            timeLimit = ChessUCI.searchTime(True, {"wtime": clocks[side] * 1000, "winc": engine["tc"][1] * 1000})
+        startTime = time.perf_counter()
+        move = ChessAI.findBestMove(gs, validMoves, engine.get("depth"), timeLimit, engine.get("nodes"), workers=1)
+        if clocks[side] is not None:
+            clocks[side] -= time.perf_counter() - startTime
+            if clocks[side] < 0:
+                outcome = ("0-1" if gs.whiteToMove else "1-0"), "time forfeit"
+                break
+            clocks[side] += engine["tc"][1]
+        sanMoves.append(ChessPGN.toSAN(gs, move, validMoves))
+        gs.makeMove(move)
+    result, termination = outcome
+    headers = {"Event": "Self-play match", "Site": "local", "Date": time.strftime("%Y.%m.%d"), "Round": gameNumber,
+               "White": white["name"], "Black": black["name"]}
+    if startFEN is not None:
+        headers["SetUp"] = "1"
+        headers["FEN"] = startFEN
+    headers["PlyCount"] = len(sanMoves)
+    headers["Termination"] = termination
+    return gameNumber, engine1White, result, headers, sanMoves, startWhiteToMove, startMoveNumber
+
+'''
+Expected score of the stronger side for an Elo difference, and the Elo difference of an expected score
+'''
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def eloDifference(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+'''
+Elo difference of engine 1 with the bounds of its 95% confidence interval, from its wins, draws and losses
+'''
+def eloEstimate(wins, draws, losses):
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloDifference(score), eloDifference(score - margin), eloDifference(score + margin)
+
+'''
+Log likelihood ratio of H1 (engine 1 is elo1 stronger) against H0 (elo0 stronger), using the normal approximation
+of the trinomial game results
+'''
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0
+    score0, score1 = expectedScore(elo0), expectedScore(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) * games / (2 * variance)
+
+'''
+SPRT bounds: H0 is accepted below the lower one, H1 above the upper one
+'''
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+'''
+Play the match and write the PGN to pgnOutput (may be None). Returns (wins, draws, losses) of engine 1
+'''
+def runMatch(engines, games, workers, seed, openingsPath=None, pgnOutput=None, sprt=None, maxPlies=MAX_PLIES):
+    openings = makeOpenings((games + 1) // 2, seed, openingsPath)
+    tasks = [(i + 1, engines, i % 2 == 0, openings[i // 2], maxPlies) for i in range(games)]
+    wins = draws = losses = 0
+    if sprt is not None:
+        lowerBound, upperBound = sprtBounds(sprt[2], sprt[3])
+    startTime = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = [pool.submit(playGame, task) for task in tasks]
+        for future in as_completed(futures):
+            gameNumber, engine1White, result, headers, sanMoves, startWhiteToMove, startMoveNumber = future.result()
+            if pgnOutput is not None:
+                ChessPGN.writeGame(pgnOutput, headers, sanMoves, result, startWhiteToMove, startMoveNumber)
+                pgnOutput.flush()
+            if result == "1/2-1/2":
+                draws += 1
+            elif (result == "1-0") == engine1White:
+                wins += 1
+            else:
+                losses += 1
+            played = wins + draws + losses
+            elo, eloLow, eloHigh = eloEstimate(wins, draws, losses)
+            status = "%d/%d games  +%d =%d -%d  elo %+.1f [%+.1f, %+.1f]  %.1f games/min" % (
+                played, games, wins, draws, losses, elo, eloLow, eloHigh,
+                played * 60 / (time.perf_counter() - startTime))
+            verdict = None
+            if sprt is not None:
+                llr = sprtLLR(wins, draws, losses, sprt[0], sprt[1])
+                status += "  LLR %.2f (%.2f, %.2f)" % (llr, lowerBound, upperBound)
+                if llr >= upperBound:
+                    verdict = "H1 accepted: %s is at least %+g Elo stronger" % (engines[0]["name"], sprt[1])
+                elif llr <= lowerBound:
+                    verdict = "H0 accepted: %s is not %+g Elo stronger" % (engines[0]["name"], sprt[1])
+            print(status)
+            if verdict is not None:
+                print("SPRT " + verdict)
+                break
+    finally:
+        pool.shutdown(cancel_futures=True)
+    return wins, draws, losses
+
+def main():
+    parser = argparse.ArgumentParser(description="self-play match between two engine configurations")
+    parser.add_argument("--engine", nargs="*", action="append", required=True, metavar="NAME=value",
+                        help="engine settings, given twice (engine 1 is the one tested)")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1, help="games played at the same time")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the random openings")
+    parser.add_argument("--openings", help="file of FEN/EPD start positions, random openings by default")
+    parser.add_argument("--pgn", help="file the games are written to")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="adjudicate longer games as draws")
+    parser.add_argument("--sprt", nargs=2, type=float, metavar=("ELO0", "ELO1"),
+                        help="run an SPRT of H0: elo = ELO0 against H1: elo = ELO1 and stop at its verdict")
+    parser.add_argument("--alpha", type=float, default=0.05, help="SPRT false positive rate")
+    parser.add_argument("--beta", type=float, default=0.05, help="SPRT false negative rate")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give --engine twice")
+    try:
+        engines = [parseEngine(words, i + 1) for i, words in enumerate(args.engine)]
+    except ValueError as error:
+        parser.error(str(error))
+    sprt = None if args.sprt is None else (args.sprt[0], args.sprt[1], args.alpha, args.beta)
+    pgnOutput = None if args.pgn is None else open(args.pgn, "w")
+    try:
+        wins, draws, losses = runMatch(engines, args.games, args.workers, args.seed, args.openings, pgnOutput, sprt,
+                                       args.max_plies)
+    finally:
+        if pgnOutput is not None:
+            pgnOutput.close()
+    elo, eloLow, eloHigh = eloEstimate(wins, draws, losses)
+    print("%s vs %s: +%d =%d -%d, elo %+.1f +- %.1f" % (engines[0]["name"], engines[1]["name"], wins, draws, losses,
+                                                      elo, (eloHigh - eloLow) / 2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# PGN reading and writing. Reads games from a PGN file one at a time and replays their SAN moves on a GameState,
+# writes moves in SAN and games in PGN export format. Large files are split at game boundaries and processed by a
+# pool of worker processes.
+# Usage:
+#   python ChessPGN.py replay games.pgn --workers 4                check that every game replays legally
+#   python ChessPGN.py rewrite games.pgn clean.pgn --workers 4     write the games again with canonical SAN
+
+import argparse
+import os
+import re
+import shutil
+import time
+from multiprocessing import Pool
+import ChessEngine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+headerPattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+movetextTokenPattern = re.compile(r"\{[^}]*\}|\(|\)|[^\s(){}]+")
+moveNumberPattern = re.compile(r"^\d+\.+")
+sanPattern = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+LINE_LENGTH = 79 #PGN export format keeps movetext lines below 80 characters
+SHARDS_PER_WORKER = 4 #more shards than workers, so a slow shard doesn't leave the other workers idle
+ENCODING = "latin-1" #maps every byte to a character, so games are written back byte for byte
+
+'''
+Read the games of a PGN file (any iterable of lines) one at a time. Yields (headers, SAN moves, result) per game,
+where headers is a dict of the tag pairs. Only the current game is held in memory
+'''
+def readGames(lines):
+    headers = {}
+    movetext = []
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%"): #escape line
+            continue
+        match = headerPattern.match(line)
+        if match:
+            if movetext: #a game without a result token ends at the next header
+                yield finishGame(headers, movetext)
+                headers, movetext = {}, []
+            headers[match.group(1)] = match.group(2)
+            continue
+        if ";" in line and "{" not in line: #rest of line comment
+            line = line[:line.index(";")]
+        if line:
+            movetext.append(line)
+            if line.split()[-1] in RESULTS:
+                yield finishGame(headers, movetext)
+                headers, movetext = {}, []
+    if movetext or headers:
+        yield finishGame(headers, movetext)
+
+def finishGame(headers, movetext):
+    sanMoves, result = tokenizeMovetext(" ".join(movetext))
+    return headers, sanMoves, headers.get("Result", result) if result == "*" else result
+
+'''
+Split PGN movetext into the SAN moves of the main line and the result, dropping comments, variations, NAGs and
+move numbers
+'''
+def tokenizeMovetext(movetext):
+    sanMoves = []
+    result = "*"
+    variationDepth = 0
+    for token in movetextTokenPattern.findall(movetext):
+        if token[0] == "{":
+            continue
+        if token == "(":
+            variationDepth += 1
+        elif token == ")":
+            variationDepth -= 1
+        elif variationDepth == 0:
+            if token in RESULTS:
+                result = token
+                continue
+            token = moveNumberPattern.sub("", token)
+            if token and token[0] != "$":
+                sanMoves.append(token)
+    return sanMoves, result
+
+'''
+The legal move of gs written as san (e.g. "Nbd7", "exd6", "O-O", "e8=Q+"). Raises ValueError if no legal move or more
+than one legal move matches
+'''
+def parseSAN(gs, san, validMoves=None):
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endCol = 6 if len(san) == 3 else 2
+        candidates = [move for move in validMoves if move.isCastleMove and move.endCol == endCol]
+    else:
+        match = sanPattern.match(san)
+        if match is None:
+            raise ValueError("not a SAN move: " + san)
+        piece, fromFile, fromRank, toSquare, promotion = match.groups()
+        piece = piece or "p"
+        endRow = ChessEngine.Move.ranksToRows[toSquare[1]]
+        endCol = ChessEngine.Move.filesToCols[toSquare[0]]
+        candidates = [move for move in validMoves
+                      if move.pieceMoved[1] == piece and move.endRow == endRow and move.endCol == endCol
+                      and (fromFile is None or move.startCol == ChessEngine.Move.filesToCols[fromFile])
+                      and (fromRank is None or move.startRow == ChessEngine.Move.ranksToRows[fromRank])
+                      and (not move.pawnPromotion or move.promotionChoice == (promotion or "Q"))]
+    if len(candidates) != 1:
+        raise ValueError("%s move: %s" % ("illegal" if len(candidates) == 0 else "ambiguous", san))
+    return candidates[0]
+
+'''
+SAN of a legal move of gs (e.g. "Nbd7", "R1e2", "exd6", "O-O", "e8=Q+"), with the file, rank or square of the
+moving piece when another piece of the same kind can reach the end square, and + or # when the move checks or mates.
+validMoves are the legal moves of gs, generated when not given
+'''
+def toSAN(gs, move, validMoves=None):
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    if move.isCastleMove:
+        san = "O-O" if move.endCol == 6 else "O-O-O"
+    else:
+        endSquare = move.getRankFile(move.endRow, move.endCol)
+        if move.pieceMoved[1] == "p":
+            san = (move.colsToFiles[move.startCol] + "x" if move.isCapture else "") + endSquare
+            if move.pawnPromotion:
+                san += "=" + move.promotionChoice
+        else:
+            others = [other for other in validMoves if other.pieceMoved == move.pieceMoved and
+                      other.endRow == move.endRow and other.endCol == move.endCol and
+                      (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+            san = move.pieceMoved[1]
+            if others:
+                if all(other.startCol != move.startCol for other in others):
+                    san += move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in others):
+                    san += move.rowsToRanks[move.startRow]
+                else:
+                    san += move.getRankFile(move.startRow, move.startCol)
+            san += ("x" if move.isCapture else "") + endSquare
+    gs.makeMove(move)
+    gs.getValidMoves()
+    if gs.checkmate:
+        san += "#"
+    elif gs.inCheck:
+        san += "+"
+    gs.undoMove()
+    return san
+
+'''
+Write a game in PGN export format: the seven tag roster first, then the other headers, then the movetext wrapped
+below 80 characters. startWhiteToMove and startMoveNumber give the move numbering of games set up from a FEN
+'''
+def writeGame(output, headers, sanMoves, result, startWhiteToMove=True, startMoveNumber=1):
+    headers = dict(headers)
+    headers["Result"] = result
+    for tag in SEVEN_TAG_ROSTER:
+        output.write('[%s "%s"]\n' % (tag, headers.pop(tag, "?")))
+    for tag, value in headers.items():
+        output.write('[%s "%s"]\n' % (tag, value))
+    output.write("\n")
+    tokens = []
+    whiteToMove, moveNumber = startWhiteToMove, startMoveNumber
+    for i, san in enumerate(sanMoves):
+        if whiteToMove:
+            tokens.append("%d." % moveNumber)
+        elif i == 0:
+            tokens.append("%d..." % moveNumber)
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            output.write(line + "\n")
+            line = token
+        else:
+            line = line + " " + token if line else token
+    output.write(line + "\n\n")
+
+'''
+Play the SAN moves on gs. Returns the canonical SAN (see toSAN) of each move when canonical is set, otherwise an empty
+list. Raises ValueError at the first illegal or ambiguous move
+'''
+def replayGame(gs, sanMoves, canonical=False):
+    canonicalMoves = []
+    for san in sanMoves:
+        validMoves = gs.getValidMoves()
+        move = parseSAN(gs, san, validMoves)
+        if canonical:
+            canonicalMoves.append(toSAN(gs, move, validMoves))
+        gs.makeMove(move)
+    return canonicalMoves
+
+'''
+Offset of the first game starting after offset in a file opened in binary mode: the first header line that follows a
+line of movetext. offset itself may fall anywhere, even in the middle of a header block
+'''
+def findGameStart(f, offset):
+    if offset == 0:
+        return 0
+    f.seek(offset)
+    f.readline() #the rest of the line offset falls in
+    seenMovetext = False
+    while True:
+        start = f.tell()
+        line = f.readline()
+        if not line:
+            return start
+        if line.startswith(b"["):
+            if seenMovetext:
+                return start
+        elif line.strip():
+            seenMovetext = True
+
+'''
+Split a PGN file into about count (start, end) byte ranges that begin and end at game boundaries
+'''
+def findShards(path, count):
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        offsets = sorted(set([findGameStart(f, size * i // count) for i in range(count)] + [size]))
+    return [(start, end) for start, end in zip(offsets, offsets[1:])]
+
+'''
+The lines of a byte range of a file opened in binary mode, decoded one at a time
+'''
+def readLines(f, start, end):
+    f.seek(start)
+    while f.tell() < end:
+        line = f.readline()
+        if not line:
+            break
+        yield line.decode(ENCODING)
+
+'''
+Runs in a worker process. Replay the games of one shard, writing them with canonical SAN to outputPath when given.
+Returns (games, plies, errors) where errors lists (game number in the shard, headers, message)
+'''
+def processShard(task):
+    path, start, end, outputPath = task
+    games = plies = 0
+    errors = []
+    output = None if outputPath is None else open(outputPath, "w", encoding=ENCODING, newline="\n")
+    with open(path, "rb") as f:
+        for headers, sanMoves, result in readGames(readLines(f, start, end)):
+            games += 1
+            try:
+                gs = ChessEngine.createGameState(fen=headers.get("FEN"))
+                startWhiteToMove, startMoveNumber = gs.whiteToMove, gs.fullmoveNumber
+                canonicalMoves = replayGame(gs, sanMoves, output is not None)
+            except ValueError as error:
+                errors.append((games, headers, str(error)))
+                continue
+            plies += len(sanMoves)
+            if output is not None:
+                writeGame(output, headers, canonicalMoves, result, startWhiteToMove, startMoveNumber)
+    if output is not None:
+        output.close()
+    return games, plies, errors
+
+'''
+Replay every game of a PGN file on a pool of worker processes, and write them with canonical SAN to outputPath when
+given (games keep their order; games that don't replay are left out). Returns (games, plies, errors, seconds)
+'''
+def processFile(path, workers=1, outputPath=None):
+    startTime = time.perf_counter()
+    shards = findShards(path, workers * SHARDS_PER_WORKER)
+    tasks = [(path, start, end, None if outputPath is None else "%s.part%d" % (outputPath, i))
+             for i, (start, end) in enumerate(shards)]
+    games = plies = 0
+    errors = []
+    with Pool(workers) as pool:
+        for shardGames, shardPlies, shardErrors in pool.imap(processShard, tasks):
+            errors.extend((games + number, headers, message) for number, headers, message in shardErrors)
+            games += shardGames
+            plies += shardPlies
+    if outputPath is not None:
+        with open(outputPath, "wb") as output:
+            for task in tasks:
+                with open(task[3], "rb") as part:
+                    shutil.copyfileobj(part, output)
+                os.remove(task[3])
+    return games, plies, errors, time.perf_counter() - startTime
+
+def main():
+    parser = argparse.ArgumentParser(description="PGN replay and rewriting")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replayParser = subparsers.add_parser("replay", help="check that every game replays legally")
+    replayParser.add_argument("pgn")
+    rewriteParser = subparsers.add_parser("rewrite", help="write the games again with canonical SAN")
+    rewriteParser.add_argument("pgn")
+    rewriteParser.add_argument("output")
+    for subparser in (replayParser, rewriteParser):
+        subparser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    args = parser.parse_args()
+
+    games, plies, errors, seconds = processFile(args.pgn, args.workers,
+                                                args.output if args.command == "rewrite" else None)
+    for number, headers, message in errors:
+        print("game %d (%s - %s): %s" % (number, headers.get("White", "?"), headers.get("Black", "?"), message))
+    print("%d games, %d plies, %d errors in %.2fs: %.1f games/s, %.0f plies/s" %
+          (games, plies, len(errors), seconds, games / seconds, plies / seconds))
+
+if __name__ == "__main__":
+    main()
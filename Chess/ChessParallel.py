@@ -0,0 +1,236 @@
+# Parallel search. Splits the root moves of each iterative deepening iteration across a pool of worker processes.
+# Usage: python ChessParallel.py --depth 4 --workers 1 2 4 8 16    time to depth for each number of workers
+
+import argparse
+import itertools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+import ChessEngine, ChessAI, ChessBench
+
+#Workers are started from a fresh process, not forked: the search runs in a background thread in ChessUCI and
+#ChessMain, and a forked child inherits the locks other threads hold (ChessUCI's main thread holds the stdin lock
+#while it waits for a command), which deadlocks it
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+CANCEL_CHECK_INTERVAL = 0.02 #seconds between checks of the cancel event while waiting for the workers
+
+processPool = None
+poolWorkers = 0
+poolCancelEvent = None #multiprocessing.Event shared with the workers, set to abort the searches they are running
+searchIDs = itertools.count(1)
+workerSearchID = None #ID of the search the tables of this worker process belong to
+workerCancelEvent = None #poolCancelEvent, in a worker process
+workerTablebaseDir = None
+
+'''
+Process pool with the given number of workers. The pool is kept between searches and replaced when the number changes
+'''
+def getPool(workers):
+    global processPool, poolWorkers, poolCancelEvent
+    if processPool is None or poolWorkers != workers:
+        shutdownPool()
+        context = multiprocessing.get_context(START_METHOD)
+        poolCancelEvent = context.Event()
+        processPool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initWorker,
+                                          initargs=(poolCancelEvent,))
+        poolWorkers = workers
+    return processPool
+
+def shutdownPool():
+    global processPool, poolWorkers, poolCancelEvent
+    if processPool is not None:
+        processPool.shutdown()
+    processPool = None
+    poolWorkers = 0
+    poolCancelEvent = None
+
+def initWorker(cancelEvent):
+    global workerCancelEvent
+    workerCancelEvent = cancelEvent
+
+'''
+The ChessAI settings a worker searches with. Workers don't share the module state of the main process, so the settings
+of the current search (e.g. from UCI options) are sent with every task
+'''
+def searchSettings():
+    settings = {name: value for name, value in vars(ChessAI).items()
+                if name.isupper() and isinstance(value, (bool, int, float))}
+    settings["hashSizeMB"] = ChessAI.transpositionTable.sizeMB
+    settings["tablebaseDir"] = None if ChessAI.tablebases is None else ChessAI.tablebases.directory
+    return settings
+
+'''
+Runs in a worker process. Make the ChessAI settings, transposition table size and tablebases those of the main process
+'''
+def applySearchSettings(settings):
+    global workerTablebaseDir
+    settings = dict(settings)
+    hashSizeMB = settings.pop("hashSizeMB")
+    tablebaseDir = settings.pop("tablebaseDir")
+    for name, value in settings.items():
+        setattr(ChessAI, name, value)
+    if ChessAI.transpositionTable.sizeMB != hashSizeMB:
+        ChessAI.transpositionTable.resize(hashSizeMB)
+    if tablebaseDir != workerTablebaseDir:
+        import ChessTablebase
+        if ChessAI.tablebases is not None:
+            ChessAI.tablebases.close()
+        ChessAI.tablebases = None if tablebaseDir is None else ChessTablebase.Tablebases(tablebaseDir)
+        workerTablebaseDir = tablebaseDir
+
+'''
+Results of the futures, in order. Sets poolCancelEvent when cancelEvent is set while waiting, so the workers abort
+their searches and return what they have
+'''
+def waitForResults(futures, cancelEvent):
+    while cancelEvent is not None and not cancelEvent.is_set():
+        done, pending = wait(futures, timeout=CANCEL_CHECK_INTERVAL)
+        if len(pending) == 0:
+            break
+    if cancelEvent is not None and cancelEvent.is_set():
+        poolCancelEvent.set()
+    return [future.result() for future in futures]
+
+'''
+Runs in a worker process. Searches the root moves with the given IDs to depth, raising alpha from the given value as
+moves are searched, and returns the list of (move ID, score, principal variation) searched, the SearchStats and whether
+the time ran out. The principal variation is the list of move IDs after the move, from the transposition table of the
+worker. Scores above the starting alpha are exact, the others are upper bounds.
+Each worker starts every new search with an empty transposition table and empty killer and history tables
+'''
+def searchRootMoves(gs, moveIDs, depth, alpha, timeLimit, searchID, settings):
+    global workerSearchID
+    if searchID != workerSearchID:
+        workerSearchID = searchID
+        applySearchSettings(settings)
+        ChessAI.transpositionTable.clear()
+        ChessAI.clearMoveOrdering()
+    ChessAI.startSearchStats()
+    ChessAI.searchDeadline = None if timeLimit is None else time.perf_counter() + timeLimit
+    ChessAI.searchNodeLimit = None
+    ChessAI.searchCancelEvent = workerCancelEvent
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    moveLogLength = len(gs.moveLog)
+    results = []
+    for moveID in moveIDs:
+        gs.makeMove(gs.moveFromID(moveID))
+        try:
+            score = -ChessAI.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -ChessAI.CHECKMATE, -alpha, -turnMultiplier, 1)
+        except ChessAI.SearchAborted:
+            while len(gs.moveLog) > moveLogLength:
+                gs.undoMove()
+            return results, ChessAI.searchStats, True
+        pvIDs = [move.moveID for move in ChessAI.getPrincipalVariation(gs, depth - 1)]
+        gs.undoMove()
+        results.append((moveID, score, pvIDs))
+        alpha = max(alpha, score)
+    return results, ChessAI.searchStats, False
+
+'''
+Store the principal variation a worker found, as move IDs from the position of gs, in the transposition table of this
+process so ChessAI.getPrincipalVariation follows it as after a serial search. The entries have depth 0, which no search
+takes a score from, so they only give the hash moves
+'''
+def storePrincipalVariation(gs, pvIDs):
+    for moveID in pvIDs:
+        ChessAI.transpositionTable.store(gs.zobristKey, 0, 0, ChessAI.TT_EXACT, moveID)
+        gs.makeMove(gs.moveFromID(moveID))
+    for moveID in pvIDs:
+        gs.undoMove()
+
+'''
+Iterative deepening with the root moves split across worker processes. Each iteration searches the best move of the
+previous iteration first, then splits the other moves round robin across the workers with its score as alpha.
+Returns the best move of the last finished iteration, with the principal variation of the worker that searched it in
+the transposition table. When cancelEvent is set the workers abort their searches through
+poolCancelEvent. onIteration works as in ChessAI.findBestMove. With one worker this is ChessAI.findBestMove, which gives
+reproducible results
+'''
+def findBestMoveParallel(gs, validMoves, workers, maxDepth=None, timeLimit=None, cancelEvent=None, onIteration=None):
+    if workers <= 1:
+        return ChessAI.findBestMove(gs, validMoves, maxDepth, timeLimit, workers=1, cancelEvent=cancelEvent,
+                                    onIteration=onIteration)
+    if maxDepth is None:
+        maxDepth = ChessAI.DEPTH if timeLimit is None else ChessAI.MAX_DEPTH
+    ChessAI.startSearchStats()
+    if len(validMoves) == 0:
+        return None
+    pool = getPool(workers)
+    poolCancelEvent.clear()
+    searchID = next(searchIDs)
+    settings = searchSettings()
+    deadline = None if timeLimit is None else time.perf_counter() + timeLimit
+    movesByID = {move.moveID: move for move in validMoves}
+    orderedIDs = [move.moveID for move in ChessAI.orderMoves(gs, validMoves, None, 0)]
+    bestMove = None
+    for depth in range(1, maxDepth + 1):
+        ChessAI.searchDepth = depth
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        if (remaining is not None and remaining <= 0) or (cancelEvent is not None and cancelEvent.is_set()):
+            break
+        #the first move alone gives the window for the rest
+        [(results, stats, aborted)] = waitForResults([pool.submit(searchRootMoves, gs, orderedIDs[:1], depth,
+                                                                  -ChessAI.CHECKMATE, remaining, searchID, settings)],
+                                                     cancelEvent)
+        ChessAI.searchStats.merge(stats)
+        if aborted or (cancelEvent is not None and cancelEvent.is_set()):
+            break
+        alpha = results[0][1]
+        remaining = None if deadline is None else deadline - time.perf_counter()
+        chunks = [orderedIDs[1 + i::workers] for i in range(workers)]
+        futures = [pool.submit(searchRootMoves, gs, chunk, depth, alpha, remaining, searchID, settings)
+                   for chunk in chunks if chunk]
+        for chunkResults, stats, chunkAborted in waitForResults(futures, cancelEvent):
+            ChessAI.searchStats.merge(stats)
+            results.extend(chunkResults)
+            aborted = aborted or chunkAborted
+        if aborted or (cancelEvent is not None and cancelEvent.is_set()):
+            break
+        #stable sort keeps the earlier move on equal scores, as the serial search does
+        scores = {moveID: score for moveID, score, pvIDs in results}
+        orderedIDs.sort(key=lambda moveID: scores[moveID], reverse=True)
+        bestMove = movesByID[orderedIDs[0]]
+        storePrincipalVariation(gs, [orderedIDs[0]] + next(pvIDs for moveID, score, pvIDs in results
+                                                           if moveID == orderedIDs[0]))
+        ChessAI.finishIteration(depth, scores[orderedIDs[0]], bestMove, onIteration)
+        if abs(scores[orderedIDs[0]]) >= ChessAI.CHECKMATE:
+            break
+    if bestMove is None: #not even depth 1 finished
+        bestMove = movesByID[orderedIDs[0]]
+    ChessAI.finishSearchStats()
+    return bestMove
+
+'''
+Search every bench position to depth with the given number of workers and return the summed node count and time.
+The pool is started before the clock starts
+'''
+def timeToDepth(depth, workers):
+    if workers > 1:
+        getPool(workers)
+    nodes = 0
+    elapsed = 0.0
+    for moveString in ChessBench.BENCH_POSITIONS:
+        gs = ChessBench.playMoves(ChessEngine.createGameState(), moveString)
+        ChessAI.transpositionTable.clear()
+        startTime = time.perf_counter()
+        findBestMoveParallel(gs, gs.getValidMoves(), workers, maxDepth=depth)
+        elapsed += time.perf_counter() - startTime
+        nodes += ChessAI.searchStats.nodes
+    return nodes, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel search scaling benchmark")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+    baseline = None
+    for workers in args.workers:
+        nodes, elapsed = timeToDepth(args.depth, workers)
+        if baseline is None:
+            baseline = elapsed
+        print("%2d workers depth %d: %d nodes, %.2fs, %.0f nodes/sec, speedup %.2f" %
+              (workers, args.depth, nodes, elapsed, nodes / elapsed, baseline / elapsed))
+    shutdownPool()
+
+if __name__ == "__main__":
+    main()
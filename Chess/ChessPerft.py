@@ -0,0 +1,191 @@
+# Perft (performance test). Counts the leaf nodes of the legal move tree to check move generation and measure its speed.
+# Usage:
+#   python ChessPerft.py --depth 4                               perft of the start position
+#   python ChessPerft.py --position kiwipete --depth 3 --divide  leaf count per root move
+#   python ChessPerft.py --fen "8/8/8/8/8/8/8/K1k5 w - - 0 1" --depth 5
+#   python ChessPerft.py --suite                                 check the reference positions against known counts
+#   python ChessPerft.py --depth 3 --evasions                    move generation time in check and out of check
+#   python ChessPerft.py --depth 4 --profile perft.prof.txt      write a cProfile report of the run, see ChessProfile
+
+import argparse
+import sys
+import time
+import ChessEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+#reference positions with their known leaf counts per depth
+PERFT_POSITIONS = {
+    "startpos": (START_FEN, {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    #en passant edge cases
+    "illegal-ep-1": ("3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1", {6: 1134888}),
+    "illegal-ep-2": ("8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", {6: 1015133}),
+    "ep-gives-check": ("8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", {6: 1440467}),
+    #castling edge cases
+    "short-castle-check": ("5k2/8/8/8/8/8/8/4K2R w K - 0 1", {6: 661072}),
+    "long-castle-check": ("3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", {6: 803711}),
+    "castle-rights": ("r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", {4: 1274206}),
+    "castle-prevented": ("r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", {4: 1720476}),
+    #promotion edge cases
+    "promote-out-of-check": ("2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", {6: 3821001}),
+    "promote-give-check": ("4k3/1P6/8/8/8/8/K7/8 w - - 0 1", {6: 217342}),
+    "underpromote-give-check": ("8/P1k5/K7/8/8/8/8/8 w - - 0 1", {6: 92683}),
+    #checks, stalemate and checkmate
+    "discovered-check": ("8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", {5: 1004658}),
+    "self-stalemate": ("K1k5/8/P7/8/8/8/8/8 w - - 0 1", {6: 2217}),
+    "stalemate-checkmate-1": ("8/k1P5/8/1K6/8/8/8/8 w - - 0 1", {7: 567584}),
+    "stalemate-checkmate-2": ("8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1", {4: 23527}),
+}
+#reference positions where the side to move is often in check, with the depth their perft is timed at
+CHECK_HEAVY_POSITIONS = (("position4", 4), ("discovered-check", 4), ("promote-out-of-check", 5),
+                         ("stalemate-checkmate-2", 4), ("castle-prevented", 3))
+
+'''
+Count the positions reachable from gs in exactly depth moves
+'''
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+'''
+Leaf count below each root move, as a list of (move notation, nodes)
+'''
+def divide(gs, depth):
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move.getChessNotation(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+def timePerft(gs, depth):
+    startTime = time.perf_counter()
+    nodes = perft(gs, depth)
+    return nodes, time.perf_counter() - startTime
+
+def nodesPerSecond(nodes, elapsed):
+    return nodes / elapsed if elapsed > 0 else 0.0
+
+'''
+Collect the FENs of the positions up to depth plies deep in the trees of the reference positions, split into positions
+where the side to move is in check and positions where it isn't
+'''
+def collectPositions(depth):
+    inCheck, notInCheck = set(), set()
+    def walk(gs, depth):
+        moves = gs.getValidMoves()
+        (inCheck if gs.inCheck else notInCheck).add(gs.getFEN())
+        if depth > 0:
+            for move in moves:
+                gs.makeMove(move)
+                walk(gs, depth - 1)
+                gs.undoMove()
+    for fen, counts in PERFT_POSITIONS.values():
+        walk(ChessEngine.createGameState(fen), depth)
+    return sorted(inCheck), sorted(notInCheck)
+
+'''
+Average seconds per getValidMoves call over the positions
+'''
+def timeMoveGeneration(fens, repeats=5):
+    states = [ChessEngine.createGameState(fen) for fen in fens]
+    startTime = time.perf_counter()
+    for i in range(repeats):
+        for gs in states:
+            gs.getValidMoves()
+    return (time.perf_counter() - startTime) / (repeats * len(states))
+
+'''
+Print the move generation time in check against out of check, then perft speed on the check heavy positions
+'''
+def evasionBench(depth):
+    inCheck, notInCheck = collectPositions(depth)
+    checkTime = timeMoveGeneration(inCheck)
+    normalTime = timeMoveGeneration(notInCheck)
+    print("in check:     %6d positions, %6.1f us per getValidMoves" % (len(inCheck), checkTime * 1e6))
+    print("not in check: %6d positions, %6.1f us per getValidMoves" % (len(notInCheck), normalTime * 1e6))
+    print("in check costs %.2f of not in check" % (checkTime / normalTime))
+    for name, perftDepth in CHECK_HEAVY_POSITIONS:
+        nodes, elapsed = timePerft(ChessEngine.createGameState(PERFT_POSITIONS[name][0]), perftDepth)
+        print("%-22s depth %d: %d nodes in %.2fs, %.0f nodes/sec" %
+              (name, perftDepth, nodes, elapsed, nodesPerSecond(nodes, elapsed)))
+
+'''
+Run perft on every reference position at every depth whose known count is at most maxNodes.
+Prints one line per check and returns the number of mismatches
+'''
+def runSuite(maxNodes):
+    failures = 0
+    for name, (fen, counts) in PERFT_POSITIONS.items():
+        for depth, expected in sorted(counts.items()):
+            if expected > maxNodes:
+                continue
+            nodes, elapsed = timePerft(ChessEngine.createGameState(fen), depth)
+            status = "ok" if nodes == expected else "FAIL"
+            if nodes != expected:
+                failures += 1
+            print("%-4s %-24s depth %d: %d nodes (expected %d) in %.2fs, %.0f nodes/sec" %
+                  (status, name, depth, nodes, expected, elapsed, nodesPerSecond(nodes, elapsed)))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation test and benchmark")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fen", help="position to search, the start position by default")
+    parser.add_argument("--position", choices=sorted(PERFT_POSITIONS), help="one of the reference positions")
+    parser.add_argument("--divide", action="store_true", help="print the leaf count below each root move")
+    parser.add_argument("--suite", action="store_true", help="check the reference positions against their known counts")
+    parser.add_argument("--evasions", action="store_true",
+                        help="time move generation in check and out of check in the trees of the reference positions")
+    parser.add_argument("--max-nodes", type=int, default=1000000, help="skip suite entries with more leaf nodes than this")
+    parser.add_argument("--profile", metavar="REPORT", help="profile the run with cProfile and write the report here")
+    args = parser.parse_args()
+    if args.profile is not None:
+        import ChessProfile
+        with ChessProfile.profile(args.profile, "ChessPerft " + " ".join(sys.argv[1:])):
+            runPerft(args)
+    else:
+        runPerft(args)
+
+def runPerft(args):
+    if args.evasions:
+        evasionBench(args.depth)
+        return
+    if args.suite:
+        failures = runSuite(args.max_nodes)
+        print("%d failures" % failures)
+        sys.exit(1 if failures else 0)
+
+    fen = args.fen
+    if args.position is not None:
+        fen = PERFT_POSITIONS[args.position][0]
+    gs = ChessEngine.createGameState(fen)
+    startTime = time.perf_counter()
+    if args.divide:
+        results = divide(gs, args.depth)
+        for notation, count in sorted(results):
+            print("%s: %d" % (notation, count))
+        nodes = sum(count for notation, count in results)
+    else:
+        nodes = perft(gs, args.depth)
+    elapsed = time.perf_counter() - startTime
+    print("depth %d: %d nodes in %.2fs, %.0f nodes/sec" % (args.depth, nodes, elapsed, nodesPerSecond(nodes, elapsed)))
+
+if __name__ == "__main__":
+    main()
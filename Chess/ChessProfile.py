@@ -0,0 +1,186 @@
+# Profiling. Runs a fixed workload (perft over the reference positions or fixed depth searches over the bench positions)
+# under cProfile, or times only the move generation and make/unmake methods with perf_counter, and writes the call
+# count, own time, cumulative time and ns per call of each function to a report file.
+# Usage:
+#   python ChessProfile.py perft --depth 3 --report perft.prof.txt       cProfile of perft
+#   python ChessProfile.py search --depth 3 --report search.prof.txt     cProfile of fixed depth searches
+#   python ChessProfile.py perft --timer                                  perf_counter timing of the hot path methods
+# In code, "with ChessProfile.profile('report.txt'):" profiles a block, and @ChessProfile.profiled('report.txt')
+# profiles every call of a function when the CHESS_PROFILE environment variable is set. Without it the decorator
+# returns the function itself, so profiling costs nothing when disabled.
+
+import argparse
+import contextlib
+import cProfile
+import functools
+import os
+import pstats
+import sys
+import time
+import ChessEngine, ChessAI, ChessBench, ChessPerft
+
+ENABLED = os.environ.get("CHESS_PROFILE", "") not in ("", "0")
+REPORT_LIMIT = 40 #functions listed in a cProfile report, by cumulative time
+PERFT_WORKLOAD = ("startpos", "kiwipete", "position3", "position4", "position5", "position6")
+#methods timed by HotPathTimer, when the class defines them itself
+HOT_PATH_METHODS = ("getValidMoves", "getCaptureMoves", "checkForPinsAndChecks", "squareUnderAttack",
+                    "getAllPossibleMoves", "getPawnMoves", "getRookMoves", "getKnightMoves",
+                    "getBishopMoves", "getQueenMoves", "getKingMoves", "getCastleMoves", "makeMove", "undoMove")
+
+'''
+Write a report table: one (name, calls, own time, cumulative time) row per function, by cumulative time.
+The own time is None when it wasn't measured
+'''
+def writeReport(output, title, rows, limit=None):
+    rows = sorted(rows, key=lambda row: row[3], reverse=True)
+    if limit is not None:
+        rows = rows[:limit]
+    output.write(title + "\n")
+    output.write("%12s %10s %10s %10s  %s\n" % ("calls", "own s", "cum s", "ns/call", "function"))
+    for name, calls, ownTime, cumulativeTime in rows:
+        output.write("%12d %10s %10.3f %10.0f  %s\n" % (calls, "-" if ownTime is None else "%.3f" % ownTime,
+                     cumulativeTime, cumulativeTime * 1e9 / calls if calls else 0.0, name))
+
+'''
+Report rows of a cProfile.Profile
+'''
+def profileRows(profiler):
+    rows = []
+    for (path, line, function), (primitiveCalls, calls, ownTime, cumulativeTime, callers) in \
+            pstats.Stats(profiler).stats.items():
+        name = function if path == "~" else "%s:%d(%s)" % (os.path.basename(path), line, function)
+        rows.append((name, calls, ownTime, cumulativeTime))
+    return rows
+
+'''
+Profile the block with cProfile and write the report to reportPath (standard output when None)
+'''
+@contextlib.contextmanager
+def profile(reportPath=None, title="profile", limit=REPORT_LIMIT):
+    profiler = cProfile.Profile()
+    startTime = time.perf_counter()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        title = "%s: %.2fs" % (title, time.perf_counter() - startTime)
+        if reportPath is None:
+            writeReport(sys.stdout, title, profileRows(profiler), limit)
+        else:
+            with open(reportPath, "w") as output:
+                writeReport(output, title, profileRows(profiler), limit)
+
+'''
+Decorator profiling every call of the function into reportPath when ENABLED. Otherwise the function is returned as it is.
+Meant for entry points like a search or a perft run, a profiler can't be started inside another one
+'''
+def profiled(reportPath=None):
+    def decorator(function):
+        if not ENABLED:
+            return function
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with profile(reportPath, function.__qualname__):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+'''
+Times the hot path methods of the game state classes with perf_counter while the with block runs, by replacing them
+with timing wrappers that are removed again on exit. Cheaper than cProfile, which slows down every call in the
+program, but the times of a method include the wrapper overhead of the timed methods it calls
+'''
+class HotPathTimer():
+    def __init__(self, classes=(ChessEngine.GameState,), methods=HOT_PATH_METHODS):
+        self.targets = [(cls, name) for cls in classes for name in methods if name in cls.__dict__]
+        self.calls = {}
+        self.times = {}
+        self.originals = []
+
+    def __enter__(self):
+        for cls, name in self.targets:
+            original = cls.__dict__[name]
+            self.originals.append((cls, name, original))
+            setattr(cls, name, self.timed(original, cls.__name__ + "." + name))
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.elapsed = time.perf_counter() - self.startTime
+        for cls, name, original in self.originals:
+            setattr(cls, name, original)
+        self.originals = []
+        return False
+
+    def timed(self, function, name):
+        calls, times = self.calls, self.times
+        calls[name] = 0
+        times[name] = 0.0
+        perfCounter = time.perf_counter
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            startTime = perfCounter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                times[name] += perfCounter() - startTime
+                calls[name] += 1
+        return wrapper
+
+    def rows(self):
+        return [(name, calls, None, self.times[name]) for name, calls in self.calls.items() if calls > 0]
+
+    def writeReport(self, output, title="hot path timing"):
+        writeReport(output, "%s: %.2fs" % (title, self.elapsed), self.rows())
+
+'''
+Perft of the reference positions to depth. Returns the leaf node count
+'''
+def perftWorkload(depth):
+    nodes = 0
+    for name in PERFT_WORKLOAD:
+        nodes += ChessPerft.perft(ChessEngine.createGameState(ChessPerft.PERFT_POSITIONS[name][0]), depth)
+    return nodes
+
+'''
+Single process fixed depth searches of the bench positions. Returns the searched node count
+'''
+def searchWorkload(depth):
+    nodes = 0
+    for moveString in ChessBench.BENCH_POSITIONS:
+        gs = ChessBench.playMoves(ChessEngine.createGameState(), moveString)
+        ChessAI.transpositionTable.clear()
+        ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=depth, workers=1)
+        nodes += ChessAI.searchStats.nodes
+    return nodes
+
+workloads = {"perft": perftWorkload, "search": searchWorkload}
+
+def main():
+    parser = argparse.ArgumentParser(description="profile move generation and search")
+    parser.add_argument("workload", choices=sorted(workloads))
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--timer", action="store_true", help="time the hot path methods instead of using cProfile")
+    parser.add_argument("--report", help="report file, standard output by default")
+    parser.add_argument("--limit", type=int, default=REPORT_LIMIT, help="functions listed in a cProfile report")
+    args = parser.parse_args()
+    workload = workloads[args.workload]
+    title = "%s depth %d" % (args.workload, args.depth)
+    startTime = time.perf_counter()
+    if args.timer:
+        with HotPathTimer() as timer:
+            nodes = workload(args.depth)
+        if args.report is None:
+            timer.writeReport(sys.stdout, title)
+        else:
+            with open(args.report, "w") as output:
+                timer.writeReport(output, title)
+    else:
+        with profile(args.report, title, args.limit):
+            nodes = workload(args.depth)
+    elapsed = time.perf_counter() - startTime
+    print("%s: %d nodes in %.2fs, %.0f nodes/sec" % (title, nodes, elapsed, nodes / elapsed))
+
+if __name__ == "__main__":
+    main()
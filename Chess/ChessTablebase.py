@@ -0,0 +1,416 @@
+# Endgame tablebases. Generates win/draw/loss and distance to mate tables for KQK, KRK, KPK and KBNK by retrograde
+# analysis, using GameState move generation as the rules, and probes them from memory mapped files.
+# Usage:
+#   python ChessTablebase.py generate --dir tablebases                generate all tables (KBNK takes a while)
+#   python ChessTablebase.py generate --dir tablebases --tables KQK   generate some of them
+#   python ChessTablebase.py probe --dir tablebases --fen "8/8/8/4k3/8/8/8/KQ6 w - - 0 1"
+
+import argparse
+import itertools
+import mmap
+import os
+import random
+import time
+from array import array
+import ChessEngine
+try:
+    import numpy as np #only needed to generate tables
+except ImportError:
+    np = None
+
+#Pieces of each table: strong king, strong pieces, weak king. The files store the strong side as white, positions with
+#black as the strong side are probed colour flipped. Tables are generated in this order, KPK looks up KQK and KRK
+TABLES = {
+    "KQK": ("wK", "wQ", "bK"),
+    "KRK": ("wK", "wR", "bK"),
+    "KPK": ("wK", "wp", "bK"),
+    "KBNK": ("wK", "wB", "wN", "bK"),
+}
+#Values are one signed byte per position, from the side to move's point of view: 0 is a draw, n > 0 mates in n plies,
+#-(n + 1) is mated in n plies (-1 is checkmate on the board)
+DRAW = 0
+ILLEGAL = -128
+MAX_PIECES = max(len(pieces) - 2 for pieces in TABLES.values()) #pieces besides the kings in the largest table (KBNK)
+#strong side material with no mating chances
+DRAWN_MATERIAL = ((), ("B",), ("N",))
+
+'''
+Reflect a square (row * 8 + col) left to right, top to bottom and along the a1-h8 diagonal
+'''
+def transformSquare(sq, flipFiles, flipRanks, flipDiagonal):
+    r, c = divmod(sq, 8)
+    if flipFiles:
+        c = 7 - c
+    if flipRanks:
+        r = 7 - r
+    if flipDiagonal:
+        r, c = 7 - c, 7 - r
+    return r * 8 + c
+
+'''
+The reflections that bring a king on sq into the a1-d1-d4 triangle
+'''
+def kingSymmetry(sq):
+    r, c = divmod(sq, 8)
+    flipFiles = c > 3
+    if flipFiles:
+        c = 7 - c
+    flipRanks = r < 4
+    if flipRanks:
+        r = 7 - r
+    return flipFiles, flipRanks, 7 - r > c
+
+#for each square of the strong king, where every square goes in the reflected position
+symmetryMaps = [[transformSquare(sq, *kingSymmetry(kingSq)) for sq in range(64)] for kingSq in range(64)]
+KING_SLOTS = sorted(set(symmetryMaps[sq][sq] for sq in range(64))) #the 10 squares of the a1-d1-d4 triangle
+kingSlotIndex = {sq: i for i, sq in enumerate(KING_SLOTS)}
+
+'''
+Position indexing of one table. Index = ((side * kingSlots + strong king slot) * 64 + square of piece 1) * 64 + ...
+with side 0 when the strong side is to move. Tables without pawns use the 8 fold symmetry of the board, so the strong
+king is always in the a1-d1-d4 triangle
+'''
+class TableLayout():
+    def __init__(self, name, pieces):
+        self.name = name
+        self.pieces = pieces
+        self.symmetric = "wp" not in pieces
+        self.kingSlots = len(KING_SLOTS) if self.symmetric else 64
+        self.size = 2 * self.kingSlots * 64 ** (len(pieces) - 1)
+
+    def index(self, squares, strongToMove):
+        if self.symmetric:
+            symmetry = symmetryMaps[squares[0]]
+            squares = [symmetry[sq] for sq in squares]
+            index = kingSlotIndex[squares[0]]
+        else:
+            index = squares[0]
+        if not strongToMove:
+            index += self.kingSlots
+        for sq in squares[1:]:
+            index = index * 64 + sq
+        return index
+
+    '''
+    Squares of the pieces and whether the strong side is to move, for every index in order
+    '''
+    def positions(self):
+        kingSquares = KING_SLOTS if self.symmetric else range(64)
+        for side, kingSq in itertools.product((0, 1), kingSquares):
+            for otherSquares in itertools.product(range(64), repeat=len(self.pieces) - 1):
+                yield (kingSq,) + otherSquares, side == 0
+
+layouts = {name: TableLayout(name, pieces) for name, pieces in TABLES.items()}
+materialTables = {tuple(piece[1] for piece in pieces[1:-1]): name for name, pieces in TABLES.items()}
+
+'''
+Value for the side to move of a position whose successor has the given value for the other side
+'''
+def parentValue(childValue):
+    if childValue < 0:
+        return -childValue #the opponent is mated in n plies, so this side mates in n + 1
+    if childValue > 0:
+        return -childValue - 2
+    return DRAW
+
+'''
+Generate the values of a table by retrograde analysis. Every legal position's moves come from GameState.getValidMoves.
+Pawn promotions look up the finished tables in generatedTables (name -> values).
+Returns the values as a numpy int8 array
+'''
+def generateTable(name, generatedTables):
+    if np is None:
+        raise ImportError("generating tablebases needs numpy")
+    layout = layouts[name]
+    gs = ChessEngine.createGameState("k7/8/8/8/8/8/8/K7 w - - 0 1") #no castling or en passant
+    gs.board = [["--"] * 8 for r in range(8)] #the pieces of each position are placed on an empty board
+
+    legal = np.zeros(layout.size, bool)
+    mated = np.zeros(layout.size, bool)
+    offsets = array("q", [0])
+    targets = array("i")
+    #best outcome reached by moves leaving the table: plies to a win, and plies to the slowest loss or -1 for a draw
+    externalWin = np.zeros(layout.size, np.int16)
+    externalLoss = np.zeros(layout.size, np.int16)
+    for index, (squares, strongToMove) in enumerate(layout.positions()):
+        if index & 0xFFFFF == 0 and index > 0:
+            print("  %s: %d of %d positions" % (name, index, layout.size))
+        offsets.append(len(targets))
+        if len(set(squares)) < len(squares):
+            continue
+        if any(piece == "wp" and sq // 8 in (0, 7) for piece, sq in zip(layout.pieces, squares)):
+            continue
+        for piece, sq in zip(layout.pieces, squares):
+            gs.board[sq // 8][sq % 8] = piece
+        gs.whiteKingLocation = divmod(squares[0], 8)
+        gs.blackKingLocation = divmod(squares[-1], 8)
+        gs.whiteToMove = not strongToMove #the side that just moved can't be in check
+        if not gs.checkForPinsAndChecks()[0]:
+            legal[index] = True
+            gs.whiteToMove = strongToMove
+            moves = gs.getValidMoves()
+            if len(moves) == 0:
+                mated[index] = gs.inCheck
+            pieceSlots = {sq: i for i, sq in enumerate(squares)}
+            for move in moves:
+                newSquares = list(squares)
+                newSquares[pieceSlots[move.startRow * 8 + move.startCol]] = move.endRow * 8 + move.endCol
+                if move.isCapture: #the weak king takes the only other piece
+                    value = parentValue(DRAW)
+                elif move.pawnPromotion:
+                    promotedTable = materialTables.get((move.promotionChoice,))
+                    if promotedTable is None:
+                        value = parentValue(DRAW)
+                    else:
+                        value = parentValue(int(generatedTables[promotedTable][layouts[promotedTable].index(newSquares, False)]))
+                else:
+                    targets.append(layout.index(newSquares, not strongToMove))
+                    continue
+                if value > 0:
+                    if externalWin[index] == 0 or value < externalWin[index]:
+                        externalWin[index] = value
+                elif value == DRAW:
+                    externalLoss[index] = -1
+                elif externalLoss[index] >= 0:
+                    externalLoss[index] = max(externalLoss[index], -value - 1)
+        for sq in squares:
+            gs.board[sq // 8][sq % 8] = "--"
+        offsets[-1] = len(targets)
+
+    offsets = np.frombuffer(offsets, np.int64)
+    targets = np.frombuffer(targets, np.int32)
+    moveCounts = np.diff(offsets)
+    hasMoves = (moveCounts > 0) | (externalWin > 0) | (externalLoss != 0)
+    WIN, LOSS = 1, 2
+    state = np.zeros(layout.size, np.int8)
+    plies = np.zeros(layout.size, np.int16)
+    state[mated] = LOSS
+    lastExternal = max(int(externalWin.max()), int(externalLoss.max()))
+    segmentSums = np.zeros(len(targets) + 1, np.int32)
+    for n in range(1, 127):
+        unknown = legal & (state == 0) & hasMoves
+        targetState = state[targets]
+        #wins: a move reaches a position lost in n - 1 plies
+        np.cumsum((targetState == LOSS) & (plies[targets] == n - 1), out=segmentSums[1:])
+        newWins = unknown & ((segmentSums[offsets[1:]] - segmentSums[offsets[:-1]] > 0) | (externalWin == n))
+        #losses: every move reaches a won position, the slowest one in n - 1 plies
+        np.cumsum(targetState != WIN, out=segmentSums[1:])
+        newLosses = unknown & ~newWins & (segmentSums[offsets[1:]] - segmentSums[offsets[:-1]] == 0) & \
+            (externalLoss >= 0) & (externalLoss < n)
+        state[newWins] = WIN
+        plies[newWins] = n
+        state[newLosses] = LOSS
+        plies[newLosses] = n
+        if not newWins.any() and not newLosses.any() and n > lastExternal:
+            break
+
+    values = np.zeros(layout.size, np.int8)
+    values[state == WIN] = plies[state == WIN]
+    values[state == LOSS] = -plies[state == LOSS] - 1
+    values[~legal] = ILLEGAL
+    return values
+
+'''
+One table file, memory mapped read only
+'''
+class Tablebase():
+    def __init__(self, path, layout):
+        self.layout = layout
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) != layout.size:
+            raise ValueError("%s has %d bytes, expected %d" % (path, len(self.data), layout.size))
+
+    def value(self, squares, strongToMove):
+        value = self.data[self.layout.index(squares, strongToMove)]
+        return value - 256 if value > 127 else value
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+'''
+The tables found in a directory, probed by material
+'''
+class Tablebases():
+    maxPieces = MAX_PIECES
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        for name, layout in layouts.items():
+            path = os.path.join(directory, name + ".tb")
+            if os.path.exists(path):
+                self.tables[name] = Tablebase(path, layout)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+
+    '''
+    Whether the material of gs can be in a table: a lone king against at most maxPieces pieces. Uses the piece counts
+    kept by the game state, so the search runs it at every node and only scans the board in probe when it passes
+    '''
+    def mayCover(self, gs):
+        white, black = gs.pieceCounts['w'], gs.pieceCounts['b']
+        return min(white, black) == 0 and max(white, black) <= self.maxPieces
+
+    '''
+    Value of the position in gs for the side to move (see DRAW), or None if it isn't covered by the tables.
+    Positions with castling rights are never covered
+    '''
+    def probe(self, gs):
+        if gs.whiteCastleKingside or gs.whiteCastleQueenside or gs.blackCastleKingside or gs.blackCastleQueenside:
+            return None
+        strongPieces = []
+        strongColour = None
+        for r in range(8):
+            row = gs.board[r]
+            for c in range(8):
+                piece = row[c]
+                if piece != "--" and piece[1] != "K":
+                    if strongColour is not None and piece[0] != strongColour or len(strongPieces) == 3:
+                        return None
+                    strongColour = piece[0]
+                    strongPieces.append((piece[1], r * 8 + c))
+        material = tuple(sorted(piece for piece, sq in strongPieces))
+        if material in DRAWN_MATERIAL:
+            return DRAW
+        table = self.tables.get(materialTables.get(material))
+        if table is None:
+            return None
+        #squares in the order of the table, flipped top to bottom when black is the strong side
+        strongToMove = gs.whiteToMove == (strongColour == "w")
+        strongKing, weakKing = (gs.whiteKingLocation, gs.blackKingLocation) if strongColour == "w" else \
+            (gs.blackKingLocation, gs.whiteKingLocation)
+        squares = [strongKing[0] * 8 + strongKing[1]]
+        for piece in table.layout.pieces[1:-1]:
+            squares.extend(sq for pieceType, sq in strongPieces if pieceType == piece[1])
+        squares.append(weakKing[0] * 8 + weakKing[1])
+        if strongColour == "b":
+            squares = [(7 - sq // 8) * 8 + sq % 8 for sq in squares]
+        return table.value(squares, strongToMove)
+
+    '''
+    The move of validMoves the tables rate best: the fastest win, else a draw, else the slowest loss.
+    None if a move leads out of the tables
+    '''
+    def bestMove(self, gs, validMoves):
+        bestMove = None
+        bestRank = None
+        for move in validMoves:
+            gs.makeMove(move)
+            value = self.probe(gs)
+            gs.undoMove()
+            if value is None:
+                return None
+            value = parentValue(value)
+            rank = (2, -value) if value > 0 else (1, 0) if value == DRAW else (0, -value)
+            if bestRank is None or rank > bestRank:
+                bestMove, bestRank = move, rank
+        return bestMove
+
+'''
+FEN of a table position, used to set up game states for probing
+'''
+def positionFEN(pieces, squares, whiteToMove):
+    board = [["--"] * 8 for r in range(8)]
+    for piece, sq in zip(pieces, squares):
+        board[sq // 8][sq % 8] = piece
+    rows = []
+    for row in board:
+        text = ""
+        empty = 0
+        for piece in row:
+            if piece == "--":
+                empty += 1
+                continue
+            if empty:
+                text += str(empty)
+                empty = 0
+            text += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+        rows.append(text + (str(empty) if empty else ""))
+    return "%s %s - - 0 1" % ("/".join(rows), "w" if whiteToMove else "b")
+
+'''
+Average time of Tablebases.probe over random legal positions of a table, in seconds
+'''
+def probeLatency(tablebases, name, samples=2000):
+    rng = random.Random(0)
+    layout = layouts[name]
+    table = tablebases.tables[name]
+    states = []
+    while len(states) < samples:
+        index = rng.randrange(layout.size)
+        if table.data[index] == ILLEGAL & 0xFF:
+            continue
+        squares, strongToMove = decodeIndex(layout, index)
+        states.append(ChessEngine.createGameState(positionFEN(layout.pieces, squares, strongToMove)))
+    startTime = time.perf_counter()
+    for gs in states:
+        tablebases.probe(gs)
+    return (time.perf_counter() - startTime) / samples
+
+'''
+Squares and side to move of a table index, the inverse of TableLayout.index for positions in canonical form
+'''
+def decodeIndex(layout, index):
+    squares = []
+    for i in range(len(layout.pieces) - 1):
+        index, sq = divmod(index, 64)
+        squares.append(sq)
+    side, slot = divmod(index, layout.kingSlots)
+    squares.append(KING_SLOTS[slot] if layout.symmetric else slot)
+    squares.reverse()
+    return squares, side == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Endgame tablebase generator and probe")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generateParser = subparsers.add_parser("generate", help="generate tables by retrograde analysis")
+    generateParser.add_argument("--dir", default="tablebases")
+    generateParser.add_argument("--tables", nargs="+", choices=list(TABLES), default=list(TABLES))
+    probeParser = subparsers.add_parser("probe", help="probe a position")
+    probeParser.add_argument("--dir", default="tablebases")
+    probeParser.add_argument("--fen", required=True)
+    args = parser.parse_args()
+
+    if args.command == "probe":
+        tablebases = Tablebases(args.dir)
+        gs = ChessEngine.createGameState(fen=args.fen)
+        value = tablebases.probe(gs)
+        if value is None:
+            print("not in the tables")
+        else:
+            print("draw" if value == DRAW else "mate in %d plies" % value if value > 0 else "mated in %d plies" % (-value - 1))
+            move = tablebases.bestMove(gs, gs.getValidMoves())
+            if move is not None:
+                print("best move %s" % move.getChessNotation())
+        return
+
+    os.makedirs(args.dir, exist_ok=True)
+    generated = {}
+    for name in TABLES:
+        path = os.path.join(args.dir, name + ".tb")
+        if name not in args.tables:
+            if name in ("KQK", "KRK") and "KPK" in args.tables and os.path.exists(path): #needed for promotions
+                generated[name] = np.fromfile(path, np.int8)
+            continue
+        if name == "KPK" and not ("KQK" in generated and "KRK" in generated):
+            raise SystemExit("KPK needs KQK and KRK, generate them first")
+        startTime = time.perf_counter()
+        values = generateTable(name, generated)
+        elapsed = time.perf_counter() - startTime
+        values.tofile(path)
+        generated[name] = values
+        legal = values[values != ILLEGAL]
+        print("%-5s %d positions (%d legal): %d wins, %d losses, %d draws, longest mate %d plies, "
+              "generated in %.1fs, %d bytes" % (name, len(values), len(legal), (legal > 0).sum(), (legal < 0).sum(),
+              (legal == 0).sum(), legal.max(), elapsed, os.path.getsize(path)))
+    tablebases = Tablebases(args.dir)
+    for name in args.tables:
+        print("%-5s probe latency %.1f us" % (name, probeLatency(tablebases, name) * 1e6))
+    tablebases.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# UCI (Universal Chess Interface) front end. Lets GUIs, tournament managers and scripts play the engine over
+# standard input and output, without pygame.
+# Usage: python ChessUCI.py
+
+import copy
+import sys
+import threading
+import time
+import ChessEngine, ChessAI
+
+ENGINE_NAME = "ChessEngine-Python"
+ENGINE_AUTHOR = "MilkTablee"
+MOVE_OVERHEAD = 0.05 #seconds kept back from every timed search for the time check interval and communication
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining clock time is shared over when the GUI doesn't say
+
+'''
+Reads UCI commands one line at a time and answers on standard output. Searches run in a background thread so "stop"
+and "isready" are answered while the engine thinks
+'''
+class UCIEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock()
+        self.gs = ChessEngine.createGameState()
+        self.searchThread = None
+        self.cancelEvent = None
+
+    def send(self, text):
+        with self.outputLock:
+            self.output.write(text + "\n")
+            self.output.flush()
+
+    '''
+    Handle one command line. Returns False on "quit"
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max 4096" % ChessAI.HASH_SIZE_MB)
+            self.send("option name Threads type spin default 1 min 1 max 64")
+            self.send("option name StatsLog type string default <empty>")
+            self.send("option name NullMove type check default %s" % str(ChessAI.NULL_MOVE_PRUNING).lower())
+            self.send("option name LMR type check default %s" % str(ChessAI.LATE_MOVE_REDUCTIONS).lower())
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ChessAI.transpositionTable.clear()
+        elif command == "setoption":
+            self.setOption(tokens)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens)
+        elif command == "go":
+            self.stopSearch()
+            self.go(tokens)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        return True
+
+    '''
+    setoption name <id> value <x>
+    '''
+    def setOption(self, tokens):
+        if "name" not in tokens or "value" not in tokens:
+            return
+        name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")]).lower()
+        value = " ".join(tokens[tokens.index("value") + 1:])
+        if name in ("hash", "threads"):
+            try:
+                number = max(1, int(value))
+            except ValueError: #keep the current setting
+                self.send("info string %s needs a number, not %s" % (name, value or "nothing"))
+                return
+        if name == "hash":
+            ChessAI.transpositionTable.resize(number)
+        elif name == "threads":
+            ChessAI.SEARCH_WORKERS = number
+        elif name == "statslog": #JSON lines file the statistics of every search are appended to
+            ChessAI.STATS_LOG = None if value in ("", "<empty>") else value
+        elif name == "nullmove":
+            ChessAI.NULL_MOVE_PRUNING = value.lower() == "true"
+        elif name == "lmr":
+            ChessAI.LATE_MOVE_REDUCTIONS = value.lower() == "true"
+
+    '''
+    position startpos|fen <fen> [moves <move1> ... <movei>] with moves in coordinate notation, e.g. e7e8q
+    '''
+    def setPosition(self, tokens):
+        movesIndex = tokens.index("moves") if "moves" in tokens else len(tokens)
+        if len(tokens) > 1 and tokens[1] == "fen":
+            try:
+                self.gs = ChessEngine.createGameState(fen=" ".join(tokens[2:movesIndex]))
+            except ValueError as error: #keep the last position
+                self.send("info string " + str(error))
+                return
+        else:
+            self.gs = ChessEngine.createGameState()
+        for text in tokens[movesIndex + 1:]:
+            for move in self.gs.getValidMoves():
+                if move.getChessNotation() == text:
+                    self.gs.makeMove(move)
+                    break
+            else:
+                self.send("info string illegal move " + text)
+                return
+
+    '''
+    go [depth n] [movetime ms] [wtime ms] [btime ms] [winc ms] [binc ms] [movestogo n] [nodes n] [infinite]
+    '''
+    def go(self, tokens):
+        params = {}
+        for i, token in enumerate(tokens):
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                try:
+                    params[token] = int(tokens[i + 1])
+                except (IndexError, ValueError): #search without it
+                    self.send("info string %s needs a number" % token)
+        infinite = "infinite" in tokens
+        maxDepth = params.get("depth")
+        timeLimit = None if infinite else searchTime(self.gs.whiteToMove, params)
+        if maxDepth is None and (infinite or timeLimit is not None or "nodes" in params):
+            maxDepth = ChessAI.MAX_DEPTH
+        self.cancelEvent = threading.Event()
+        self.searchThread = threading.Thread(target=self.search, daemon=True,
+                                             args=(copy.deepcopy(self.gs), maxDepth, timeLimit, params.get("nodes"),
+                                                   infinite, self.cancelEvent))
+        self.searchThread.start()
+
+    def search(self, gs, maxDepth, timeLimit, nodeLimit, infinite, cancelEvent):
+        startTime = time.perf_counter()
+        validMoves = gs.getValidMoves()
+
+        def onIteration(depth, score, move, nodes):
+            elapsed = time.perf_counter() - startTime
+            pv = ChessAI.getPrincipalVariation(gs, depth)
+            if len(pv) == 0 or pv[0] != move:
+                pv = [move]
+            self.send("info depth %d score %s nodes %d nps %d time %d pv %s" %
+                      (depth, uciScore(gs, score, pv), nodes, nodes / elapsed if elapsed > 0 else 0, elapsed * 1000,
+                       " ".join(pvMove.getChessNotation() for pvMove in pv)))
+
+        bestMove = None
+        if len(validMoves) > 0:
+            bestMove = ChessAI.findBestMove(gs, validMoves, maxDepth, timeLimit, nodeLimit, cancelEvent=cancelEvent,
+                                            onIteration=onIteration)
+        if infinite: #the best move is only sent after "stop"
+            cancelEvent.wait()
+        if bestMove is None:
+            self.send("bestmove 0000")
+            return
+        pv = ChessAI.getPrincipalVariation(gs, 2)
+        if len(pv) == 2 and pv[0] == bestMove:
+            self.send("bestmove %s ponder %s" % (bestMove.getChessNotation(), pv[1].getChessNotation()))
+        else:
+            self.send("bestmove " + bestMove.getChessNotation())
+
+    '''
+    Stop a running search and wait for it to send its best move
+    '''
+    def stopSearch(self):
+        if self.searchThread is not None:
+            self.cancelEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+'''
+Score for an info line: "mate n" in moves, negative when the side to move gets mated, for checkmates found by the
+search and for tablebase wins and losses, otherwise "cp n"
+'''
+def uciScore(gs, score, pv):
+    if abs(score) >= ChessAI.CHECKMATE:
+        plies = len(pv)
+    elif abs(score) > ChessAI.TABLEBASE_WIN - ChessAI.MAX_PLY and ChessAI.tablebases is not None:
+        plies = pliesToTablebase(gs, pv) + ChessAI.TABLEBASE_WIN - abs(score) #the score counts from the probed position
+    else:
+        return "cp %d" % score
+    return "mate %d" % ((plies + 1) // 2 if score > 0 else -(plies // 2))
+
+'''
+Plies along the principal variation to the first position in the tablebases. The search doesn't store probed
+positions in the transposition table, so the principal variation ends there when no position on it is covered
+'''
+def pliesToTablebase(gs, pv):
+    plies = 0
+    for move in pv:
+        gs.makeMove(move)
+        plies += 1
+        if ChessAI.tablebases.mayCover(gs) and ChessAI.tablebases.probe(gs) is not None:
+            break
+    for i in range(plies): #gs is left as it was
+        gs.undoMove()
+    return plies
+
+'''
+Seconds to search from the go parameters: movetime, or a share of the clock of the side to move plus most of the
+increment. None when the search has no time limit
+'''
+def searchTime(whiteToMove, params):
+    if "movetime" in params:
+        return max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+    remaining = params.get("wtime" if whiteToMove else "btime")
+    if remaining is None:
+        return None
+    increment = params.get("winc" if whiteToMove else "binc", 0)
+    movesToGo = params.get("movestogo", DEFAULT_MOVES_TO_GO)
+    share = remaining / 1000 / movesToGo + increment / 1000 * 0.75
+    return max(0.01, min(share, remaining / 1000 / 2) - MOVE_OVERHEAD)
+
+def main():
+    engine = UCIEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+if __name__ == "__main__":
+    main()
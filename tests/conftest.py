@@ -0,0 +1,19 @@
+import os
+import sys
+import pytest
+
+#the engine modules import each other by their plain names, so they are imported from the Chess directory
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Chess"))
+
+@pytest.fixture(scope="session")
+def tablebases(tmp_path_factory):
+    pytest.importorskip("numpy") #generating the tables needs numpy
+    import ChessTablebase
+    directory = tmp_path_factory.mktemp("tablebases")
+    generated = {}
+    for name in ("KQK", "KRK"):
+        generated[name] = ChessTablebase.generateTable(name, generated)
+        generated[name].tofile(str(directory / (name + ".tb")))
+    tablebases = ChessTablebase.Tablebases(str(directory))
+    yield tablebases
+    tablebases.close()
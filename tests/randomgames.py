@@ -0,0 +1,46 @@
+'''
+Random walks through the move tree for the consistency tests. Castling, en passant and promotions are picked whenever
+one is legal, so they come up far more often than in random games
+'''
+import ChessEngine, ChessPerft
+
+#reference positions with castling rights, en passant chances and promotions close to the start
+START_POSITIONS = ("startpos", "kiwipete", "position3", "position4", "position5", "castle-rights",
+                   "promote-out-of-check", "ep-gives-check")
+
+def isSpecial(move):
+    return move.isCastleMove or move.isEnpassantMove or move.pawnPromotion
+
+'''
+Play plies random steps from each start position. A step makes a move, passes with a null move (not in check, never
+twice in a row) or takes the last step back. check(gs) is called after every step
+'''
+def randomWalk(rng, check, plies=200, nullMoves=True):
+    for name in START_POSITIONS:
+        gs = ChessEngine.createGameState(ChessPerft.PERFT_POSITIONS[name][0])
+        check(gs)
+        steps = [] #"move" or "null", to take back in reverse order
+        for ply in range(plies):
+            moves = gs.getValidMoves()
+            roll = rng.random()
+            if len(steps) > 0 and (len(moves) == 0 or roll < 0.2):
+                if steps.pop() == "null":
+                    gs.undoNullMove()
+                else:
+                    gs.undoMove()
+            elif nullMoves and roll < 0.3 and not gs.inCheck and (len(steps) == 0 or steps[-1] != "null"):
+                gs.makeNullMove()
+                steps.append("null")
+            elif len(moves) > 0:
+                specialMoves = [move for move in moves if isSpecial(move)]
+                gs.makeMove(rng.choice(specialMoves if specialMoves and rng.random() < 0.7 else moves))
+                steps.append("move")
+            else:
+                break
+            check(gs)
+        while steps:
+            if steps.pop() == "null":
+                gs.undoNullMove()
+            else:
+                gs.undoMove()
+            check(gs)
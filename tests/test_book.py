@@ -0,0 +1,116 @@
+import random
+import pytest
+import ChessEngine, ChessBook
+
+#keys from the Polyglot book format description
+REFERENCE_KEYS = (
+    ((), 0x463B96181691FC9C),
+    (("e2e4",), 0x823C9B50FD114196),
+    (("e2e4", "d7d5"), 0x0756B94461C50FB0),
+    (("e2e4", "d7d5", "e4e5"), 0x662FAFB965DB29D4),
+    (("e2e4", "d7d5", "e4e5", "f7f5"), 0x22A48B5A8E47FF78),
+    (("e2e4", "d7d5", "e4e5", "f7f5", "e1e2"), 0x652A607CA3F242C1),
+    (("e2e4", "d7d5", "e4e5", "f7f5", "e1e2", "e8f7"), 0x00FDD303C946BDD9),
+    (("a2a4", "b7b5", "h2h4", "b5b4", "c2c4"), 0x3C8123EA7B067637),
+    (("a2a4", "b7b5", "h2h4", "b5b4", "c2c4", "b4c3", "a1a3"), 0x5C3F9B829B279560),
+)
+
+@pytest.mark.parametrize("moves, key", REFERENCE_KEYS)
+def test_reference_keys(moves, key):
+    gs = ChessEngine.createGameState()
+    for notation in moves:
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+    assert ChessBook.polyglotKey(gs) == key
+
+def test_find_entries(tmp_path):
+    path = tmp_path / "keys.bin"
+    keys = (1, 5, 5, 5, 9, 2**64 - 1)
+    with open(path, "wb") as f:
+        for i, key in enumerate(keys):
+            f.write(ChessBook.entryStruct.pack(key, i, 10 * i, 0))
+    book = ChessBook.OpeningBook(path)
+    assert book.findEntries(1) == [(0, 0, 0)] #first entry
+    assert book.findEntries(2**64 - 1) == [(5, 50, 0)] #last entry
+    assert book.findEntries(5) == [(1, 10, 0), (2, 20, 0), (3, 30, 0)] #duplicate keys, in file order
+    for key in (0, 3, 10, 2**64 - 2):
+        assert book.findEntries(key) == []
+    book.close()
+    open(path, "wb").close()
+    book = ChessBook.OpeningBook(path)
+    assert book.findEntries(1) == []
+    book.close()
+
+#(FEN, move, Polyglot move): castling is written as the king taking its own rook
+ENCODED_MOVES = (
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1", 4 << 6 | 7),
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1c1", 4 << 6 | 0),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8g8", 60 << 6 | 63),
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8", 60 << 6 | 56),
+    ("4k3/8/8/8/8/8/8/4K2R w K - 0 1", "e1f1", 4 << 6 | 5),
+)
+
+@pytest.mark.parametrize("fen, notation, polyglotMove", ENCODED_MOVES)
+def test_encode_castling(fen, notation, polyglotMove):
+    gs = ChessEngine.createGameState(fen)
+    validMoves = gs.getValidMoves()
+    move = next(move for move in validMoves if move.getChessNotation() == notation)
+    assert ChessBook.encodeMove(move) == polyglotMove
+    assert ChessBook.decodeMove(gs, polyglotMove, validMoves) is move
+
+def test_encode_promotions():
+    gs = ChessEngine.createGameState("n1n1k3/1P6/8/8/8/8/8/4K3 w - - 0 1")
+    validMoves = gs.getValidMoves()
+    promotions = [move for move in validMoves if move.pawnPromotion]
+    assert len(promotions) == 12 #b8, a8 and c8, four pieces each
+    for move in promotions:
+        polyglotMove = ChessBook.encodeMove(move)
+        assert polyglotMove >> 12 == "NBRQ".index(move.promotionChoice) + 1
+        assert ChessBook.decodeMove(gs, polyglotMove, validMoves) is move
+    pushToQueen = next(move for move in promotions if move.endCol == 1 and move.promotionChoice == "Q")
+    assert ChessBook.decodeMove(gs, ChessBook.encodeMove(pushToQueen) & 0xFFF, validMoves) is pushToQueen
+
+BOOK_GAMES = '''[Result "1-0"]
+
+1. e4 e5 2. Nf3 1-0
+
+[Result "0-1"]
+
+1. e4 c5 0-1
+
+[Result "1/2-1/2"]
+
+1. d4 d5 1/2-1/2
+
+[Result "1-0"]
+
+1. e4 e5 1-0
+
+[FEN "not a position"]
+
+1. d4 1-0
+'''
+
+def bookMoves(book, gs):
+    return sorted((move.getChessNotation(), weight) for move, weight in book.getBookMoves(gs))
+
+def test_build_book(tmp_path):
+    pgnPath, bookPath = tmp_path / "games.pgn", tmp_path / "book.bin"
+    pgnPath.write_text(BOOK_GAMES, encoding="latin-1")
+    assert ChessBook.buildBook(pgnPath, bookPath) == 6
+    book = ChessBook.OpeningBook(bookPath)
+    gs = ChessEngine.createGameState()
+    #a move scores 2 per win and 1 per draw for the side that played it
+    assert bookMoves(book, gs) == [("d2d4", 1), ("e2e4", 4)]
+    assert book.getMove(gs, selection="best").getChessNotation() == "e2e4"
+    rng = random.Random(6)
+    picks = [book.getMove(gs, rng=rng).getChessNotation() for i in range(500)]
+    assert set(picks) == {"e2e4", "d2d4"}
+    assert 350 <= picks.count("e2e4") <= 450
+    gs.makeMove(book.getMove(gs, selection="best"))
+    assert bookMoves(book, gs) == [("c7c5", 2), ("e7e5", 0)]
+    assert book.getMove(gs, rng=rng).getChessNotation() == "c7c5" #moves with no weight are never picked
+    gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == "a7a6"))
+    assert book.getMove(gs) is None
+    book.close()
+    assert ChessBook.buildBook(pgnPath, bookPath, minGames=2) == 2
+    assert ChessBook.buildBook(pgnPath, bookPath, plies=1) == 2
@@ -0,0 +1,20 @@
+import random
+import pytest
+import ChessEngine, ChessAI, ChessEvaluation
+from randomgames import randomWalk
+
+def test_incremental_terms_match_full_scan():
+    def check(gs):
+        assert (gs.middlegameScore, gs.endgameScore, gs.gamePhase) == gs.computeEvaluationTerms(), gs.getFEN()
+        assert gs.pieceCounts == gs.countPieces(), gs.getFEN()
+        assert ChessAI.scoreBoard(gs) == ChessAI.scoreBoard(ChessEngine.createGameState(gs.getFEN()))
+    randomWalk(random.Random(2), check)
+
+def test_batch_scores_match_scoreBoard():
+    pytest.importorskip("numpy")
+    positions = []
+    randomWalk(random.Random(3), lambda gs: positions.append(ChessEngine.createGameState(fen=gs.getFEN())),
+               plies=40, nullMoves=False)
+    assert len(positions) >= 200
+    batchScores = ChessAI.scoreBoards([ChessEvaluation.encodeBoard(gs.board) for gs in positions])
+    assert [int(score) for score in batchScores] == [ChessAI.scoreBoard(gs) for gs in positions]
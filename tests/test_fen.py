@@ -0,0 +1,33 @@
+import pytest
+import ChessEngine, ChessPerft
+
+MALFORMED_FENS = (
+    "8/8/8/8/8/8/8/X7 w - - 0 1", #unknown piece
+    "4k3/8/8/8/8/8/8/4K2 w - - 0 1", #short rank
+    "4k3/8/8/8/8/8/8/4K3/8 w - - 0 1", #9 ranks
+    "4k3/8/8/8/8/8/8/4K3 x - - 0 1", #side to move
+    "4k3/8/8/8/8/8/8/4K3 w KX - 0 1", #castling field
+    "4k3/8/8/8/8/8/8/4K3 w KK - 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - e9 0 1", #en passant square
+    "4k3/8/8/8/8/8/8/4K3 w - e3 0 1",
+    "4k3/8/8/8/8/8/8/4K3 w - - a 1", #move counters
+    "8/8/8/8/8/8/8/4K3 w - - 0 1", #kings
+    "4k3/8/8/8/8/8/8/3KK3 w - - 0 1",
+    "P3k3/8/8/8/8/8/8/4K3 w - - 0 1", #pawn on the last rank
+)
+
+def test_round_trip():
+    for fen, counts in ChessPerft.PERFT_POSITIONS.values():
+        gs = ChessEngine.createGameState(fen)
+        assert gs.getFEN() == fen
+        assert len(gs.getValidMoves()) == counts.get(1, len(gs.getValidMoves()))
+
+@pytest.mark.parametrize("fen", MALFORMED_FENS)
+def test_malformed_fen_leaves_state_unchanged(fen):
+    gs = ChessEngine.createGameState(ChessPerft.PERFT_POSITIONS["kiwipete"][0])
+    with pytest.raises(ValueError):
+        gs.loadFEN(fen)
+    assert gs.getFEN() == ChessPerft.PERFT_POSITIONS["kiwipete"][0]
+    assert gs.zobristKey == gs.computeZobristKey()
+    assert gs.whiteKingLocation == (7, 4) and gs.blackKingLocation == (0, 4)
+    assert ChessPerft.perft(gs, 1) == 48
@@ -0,0 +1,29 @@
+import pytest
+import ChessEngine, ChessAI, ChessParallel
+from ChessPerft import PERFT_POSITIONS
+
+DEPTH = 3
+
+def search(fen, workers):
+    ChessAI.transpositionTable.clear()
+    ChessAI.clearMoveOrdering()
+    gs = ChessEngine.createGameState(fen)
+    iterations = []
+    move = ChessParallel.findBestMoveParallel(gs, gs.getValidMoves(), workers, maxDepth=DEPTH,
+                                              onIteration=lambda depth, score, move, nodes: iterations.append(score))
+    return gs, move, iterations[-1]
+
+@pytest.fixture(scope="module", autouse=True)
+def pool():
+    yield
+    ChessParallel.shutdownPool()
+
+@pytest.mark.parametrize("name", ["startpos", "kiwipete", "position3"])
+def test_parallel_matches_serial(name):
+    fen = PERFT_POSITIONS[name][0]
+    gs, serialMove, serialScore = search(fen, 1)
+    gs, move, score = search(fen, 2)
+    assert (move.moveID, score) == (serialMove.moveID, serialScore)
+    #the principal variation of the worker is reported, not only the root move
+    pv = ChessAI.getPrincipalVariation(gs, DEPTH)
+    assert pv[0] == move and len(pv) > 1
@@ -0,0 +1,13 @@
+import pytest
+import ChessEngine, ChessPerft
+
+#shallow depths of the reference positions, so the whole set runs in a few seconds
+SHALLOW_PERFT = (("startpos", 3), ("kiwipete", 2), ("position3", 3), ("position4", 3), ("position5", 2),
+                 ("position6", 2))
+
+@pytest.mark.parametrize("name, depth", SHALLOW_PERFT)
+def test_reference_counts(name, depth):
+    fen, counts = ChessPerft.PERFT_POSITIONS[name]
+    gs = ChessEngine.createGameState(fen)
+    assert ChessPerft.perft(gs, depth) == counts[depth]
+    assert gs.getFEN() == ChessEngine.createGameState(fen).getFEN() #every move was taken back
@@ -0,0 +1,57 @@
+import random
+import pytest
+import ChessEngine, ChessPGN
+from randomgames import randomWalk
+
+def test_san_round_trip():
+    def check(gs):
+        validMoves = gs.getValidMoves()
+        for move in validMoves:
+            san = ChessPGN.toSAN(gs, move, validMoves)
+            assert ChessPGN.parseSAN(gs, san, validMoves).moveID == move.moveID, (gs.getFEN(), san)
+    randomWalk(random.Random(5), check, plies=40)
+
+#(FEN, move, its SAN, a SAN that matches more than one move)
+DISAMBIGUATION = (
+    ("4k3/8/8/8/8/8/8/1N2KN2 w - - 0 1", "b1d2", "Nbd2", "Nd2"), #knights on b1 and f1, by file
+    ("4k3/8/8/R7/8/8/8/R3K3 w - - 0 1", "a1a3", "R1a3", "Ra3"), #rooks on a1 and a5, by rank
+    ("4k3/8/8/8/8/Q7/8/Q1Q1K3 w - - 0 1", "a1b2", "Qa1b2", "Qab2"), #queens on a3 and c1 share the file and rank
+)
+
+@pytest.mark.parametrize("fen, notation, san, ambiguousSAN", DISAMBIGUATION)
+def test_disambiguation(fen, notation, san, ambiguousSAN):
+    gs = ChessEngine.createGameState(fen)
+    move = next(move for move in gs.getValidMoves() if move.getChessNotation() == notation)
+    assert ChessPGN.toSAN(gs, move) == san
+    assert ChessPGN.parseSAN(gs, san).moveID == move.moveID
+    with pytest.raises(ValueError):
+        ChessPGN.parseSAN(gs, ambiguousSAN)
+
+def test_promotion_with_check():
+    gs = ChessEngine.createGameState("k7/4P3/8/8/8/8/8/4K3 w - - 0 1")
+    promotions = {move.promotionChoice: ChessPGN.toSAN(gs, move) for move in gs.getValidMoves() if move.pawnPromotion}
+    assert promotions == {"Q": "e8=Q+", "R": "e8=R+", "B": "e8=B", "N": "e8=N"}
+    for piece, san in promotions.items():
+        assert ChessPGN.parseSAN(gs, san).promotionChoice == piece
+    gs = ChessEngine.createGameState("3r3k/4P1pp/8/8/8/8/8/4K3 w - - 0 1")
+    move = ChessPGN.parseSAN(gs, "exd8=Q#")
+    assert (move.isCapture, move.promotionChoice) == (True, "Q")
+    assert ChessPGN.toSAN(gs, move) == "exd8=Q#"
+
+def test_shards_parse_every_game_once(tmp_path):
+    path = tmp_path / "games.pgn"
+    with open(path, "w", encoding=ChessPGN.ENCODING, newline="\n") as f:
+        for i in range(30):
+            f.write('[Event "Test"]\n[White "R\xe9ti"]\n[Round "%d"]\n\n1. e4 e5 2. Nf3 Nc6\n3. Bb5 a6\n' % i)
+            #every third game has no result token, so its movetext runs straight into the next headers
+            if i % 3 != 0:
+                f.write("1-0\n\n")
+    for count in range(1, 40):
+        rounds = []
+        with open(path, "rb") as f:
+            for start, end in ChessPGN.findShards(path, count):
+                for headers, sanMoves, result in ChessPGN.readGames(ChessPGN.readLines(f, start, end)):
+                    assert headers["White"] == "R\xe9ti"
+                    assert len(sanMoves) == 6
+                    rounds.append(int(headers["Round"]))
+        assert sorted(rounds) == list(range(30)), count
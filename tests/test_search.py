@@ -0,0 +1,103 @@
+import pytest
+import ChessEngine, ChessAI, ChessPerft
+
+@pytest.mark.parametrize("limits", [{"nodeLimit": 1}, {"nodeLimit": 3000}, {"timeLimit": 0}])
+def test_aborted_search_returns_a_move(limits):
+    fen = ChessPerft.PERFT_POSITIONS["kiwipete"][0]
+    gs = ChessEngine.createGameState(fen)
+    validMoves = gs.getValidMoves()
+    ChessAI.transpositionTable.clear()
+    move = ChessAI.findBestMove(gs, validMoves, workers=1, **limits)
+    assert move in validMoves
+    assert gs.getFEN() == fen
+
+def test_search_aborted_before_any_root_move_returns_the_first_ordered_move(monkeypatch):
+    def abort(*args):
+        raise ChessAI.SearchAborted()
+    monkeypatch.setattr(ChessAI, "quiescence", abort) #the search stops in its first leaf
+    fen = ChessPerft.PERFT_POSITIONS["kiwipete"][0]
+    gs = ChessEngine.createGameState(fen)
+    validMoves = gs.getValidMoves()
+    move = ChessAI.findBestMove(gs, validMoves, maxDepth=3, workers=1)
+    assert move is ChessAI.orderMoves(gs, validMoves, None, 0)[0]
+    assert gs.getFEN() == fen
+
+def test_transposition_table_replacement():
+    table = ChessAI.TranspositionTable(1)
+    key, sameBucket = 5, 5 + table.numBuckets
+    assert table.probe(key) is None
+    table.store(key, 4, 30, ChessAI.TT_EXACT, 100)
+    assert table.probe(key) == (key, 4, 30, ChessAI.TT_EXACT, 100)
+    assert table.probe(sameBucket) is None #same bucket, different key
+    #a shallower entry doesn't push out a deeper one, it goes to the always replace slot
+    table.store(sameBucket, 2, -10, ChessAI.TT_LOWERBOUND, 200)
+    assert table.probe(key)[1] == 4
+    assert table.probe(sameBucket) == (sameBucket, 2, -10, ChessAI.TT_LOWERBOUND, 200)
+    #and the next shallow entry replaces it
+    otherKey = 5 + 2 * table.numBuckets
+    table.store(otherKey, 1, 0, ChessAI.TT_UPPERBOUND, None)
+    assert table.probe(sameBucket) is None
+    assert table.probe(otherKey)[1] == 1
+    assert table.probe(key)[1] == 4
+    #an entry at least as deep takes the depth preferred slot
+    table.store(sameBucket, 4, 50, ChessAI.TT_EXACT, 300)
+    assert table.probe(key) is None
+    assert table.probe(sameBucket)[1:] == (4, 50, ChessAI.TT_EXACT, 300)
+    assert table.probe(otherKey)[1] == 1
+
+def test_transposition_table_resize():
+    table = ChessAI.TranspositionTable(1)
+    table.store(5, 4, 30, ChessAI.TT_EXACT, 100)
+    table.resize(3)
+    assert table.sizeMB == 3
+    assert table.probe(5) is None #resizing clears the table
+    assert table.numBuckets & (table.numBuckets - 1) == 0
+    assert table.numBuckets * 2 * table.ENTRY_SIZE <= 3 * 1024 * 1024 < table.numBuckets * 4 * table.ENTRY_SIZE
+    table.resize(0)
+    assert table.numBuckets == 1
+    table.store(5, 1, 0, ChessAI.TT_EXACT, None)
+    table.store(6, 1, 0, ChessAI.TT_EXACT, None)
+    assert table.probe(5) is None and table.probe(6) is not None
+
+def test_search_stores_the_root():
+    gs = ChessEngine.createGameState(ChessPerft.PERFT_POSITIONS["position3"][0])
+    ChessAI.transpositionTable.clear()
+    move = ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=3, workers=1)
+    entry = ChessAI.transpositionTable.probe(gs.zobristKey)
+    assert entry[1] == 3 and entry[4] == move.moveID
+
+def searchScores(fen, depth):
+    gs = ChessEngine.createGameState(fen)
+    ChessAI.transpositionTable.clear()
+    scores = []
+    move = ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=depth, workers=1,
+                                onIteration=lambda depth, score, bestMove, nodes: scores.append(score))
+    return move, scores
+
+#mates in 3 whose checks and quiet defences late in the move order would be reduced without the LMR exceptions
+MATES_IN_THREE = (
+    "4R3/8/k7/2K5/1p2p3/N7/8/8 w - - 0 1", #1.Kc6, lost when checking moves were reduced
+    "r1b3kr/ppp1Bp1p/1b6/n2P4/2p3q1/2Q2N2/P4PPP/RN2R1K1 w - - 1 1", #1.Qxh8+ Kxh8 2.Bf6+
+)
+
+@pytest.mark.parametrize("fen", MATES_IN_THREE)
+def test_late_move_reductions_keep_mates(fen, monkeypatch):
+    monkeypatch.setattr(ChessAI, "LATE_MOVE_REDUCTIONS", True)
+    move, scores = searchScores(fen, 5)
+    assert scores[-1] >= ChessAI.CHECKMATE
+    assert scores[-2] < ChessAI.CHECKMATE #the mate needs the full depth
+    assert ChessAI.searchStats.prunes.get("lmr", 0) > 0
+
+def test_no_null_move_in_pawn_endings(monkeypatch):
+    #passing would be good for black here, so null move pruning misjudges white's moves if it is allowed
+    fen = "k7/2K1p3/8/8/6P1/8/8/8 w - - 0 1"
+    gs = ChessEngine.createGameState(fen)
+    assert not ChessAI.nullMoveIsSafe(gs)
+    gs.makeNullMove()
+    assert not ChessAI.nullMoveIsSafe(gs)
+    monkeypatch.setattr(ChessAI, "NULL_MOVE_PRUNING", True)
+    withNullMove = searchScores(fen, 7)
+    assert ChessAI.searchStats.prunes.get("nullMove", 0) == 0
+    monkeypatch.setattr(ChessAI, "NULL_MOVE_PRUNING", False)
+    withoutNullMove = searchScores(fen, 7)
+    assert withNullMove[0] == withoutNullMove[0] and withNullMove[1][-1] == withoutNullMove[1][-1]
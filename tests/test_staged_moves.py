@@ -0,0 +1,20 @@
+import random
+from randomgames import randomWalk
+
+def test_staged_moves_match_valid_moves():
+    rng = random.Random(4)
+    staleIDs = [None] #a move of an earlier position, like a killer left over from a sibling node
+    def check(gs):
+        validMoves = gs.getValidMoves()
+        if len(validMoves) == 0:
+            return
+        hashMove = rng.choice(validMoves)
+        quietMoves = [move for move in validMoves if not move.isCapture and not move.pawnPromotion]
+        killerIDs = [move.moveID for move in rng.sample(quietMoves, min(2, len(quietMoves)))] + staleIDs
+        stagedMoves = list(gs.getStagedMoves(hashMove.moveID, killerIDs, quietScore=lambda move: move.moveID))
+        stagedIDs = [move.moveID for move in stagedMoves]
+        assert len(stagedIDs) == len(set(stagedIDs)), gs.getFEN()
+        assert set(stagedIDs) == set(move.moveID for move in validMoves), gs.getFEN()
+        assert stagedIDs[0] == hashMove.moveID
+        staleIDs[0] = rng.choice(validMoves).moveID
+    randomWalk(rng, check)
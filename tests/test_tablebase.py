@@ -0,0 +1,85 @@
+import random
+import pytest
+import ChessEngine, ChessAI, ChessTablebase
+np = pytest.importorskip("numpy") #generating the tables needs numpy
+
+#(FEN, value for the side to move: n > 0 mates in n plies, -(n + 1) is mated in n plies, 0 is a draw)
+KNOWN_VALUES = (
+    ("k7/8/1K6/8/8/8/7Q/8 w - - 0 1", 1), #Qh8#
+    ("k7/1Q6/1K6/8/8/8/8/8 b - - 0 1", -1), #checkmated
+    ("k7/8/1Q6/8/8/8/8/7K b - - 0 1", ChessTablebase.DRAW), #stalemate
+    ("k7/1Q6/8/8/8/8/8/7K b - - 0 1", ChessTablebase.DRAW), #Kxb7
+    ("k7/8/1K6/8/8/8/8/7R w - - 0 1", 1), #Rh8#
+    ("k7/2K5/8/8/8/8/8/1R6 b - - 0 1", -3), #Ka7 Ra1#
+    ("k7/1R6/8/8/8/8/8/7K b - - 0 1", ChessTablebase.DRAW), #Kxb7
+)
+
+@pytest.mark.parametrize("fen, value", KNOWN_VALUES)
+def test_known_values(tablebases, fen, value):
+    assert tablebases.probe(ChessEngine.createGameState(fen)) == value
+
+def test_longest_mates(tablebases):
+    #the longest wins are mate in 10 moves with a queen and mate in 16 moves with a rook
+    for name, plies in (("KQK", 19), ("KRK", 31)):
+        assert np.frombuffer(tablebases.tables[name].data, np.int8).max() == plies
+
+def flipColours(fen):
+    fields = fen.split()
+    fields[0] = "/".join(reversed(fields[0].swapcase().split("/")))
+    fields[1] = "b" if fields[1] == "w" else "w"
+    return " ".join(fields)
+
+@pytest.mark.parametrize("name", ["KQK", "KRK"])
+def test_random_positions(tablebases, name):
+    rng = random.Random(7)
+    layout = ChessTablebase.layouts[name]
+    table = tablebases.tables[name]
+    checked = 0
+    while checked < 200:
+        index = rng.randrange(layout.size)
+        if table.data[index] == ChessTablebase.ILLEGAL & 0xFF:
+            continue
+        squares, strongToMove = ChessTablebase.decodeIndex(layout, index)
+        fen = ChessTablebase.positionFEN(layout.pieces, squares, strongToMove)
+        gs = ChessEngine.createGameState(fen)
+        value = tablebases.probe(gs)
+        #black as the strong side is probed colour flipped
+        assert tablebases.probe(ChessEngine.createGameState(flipColours(fen))) == value, fen
+        #the value is the best one reachable in one move
+        validMoves = gs.getValidMoves()
+        childValues = []
+        for move in validMoves:
+            gs.makeMove(move)
+            childValues.append(ChessTablebase.parentValue(tablebases.probe(gs)))
+            gs.undoMove()
+        if len(validMoves) == 0:
+            assert value == (-1 if gs.inCheck else ChessTablebase.DRAW), fen
+        elif value > 0:
+            assert value == min(childValue for childValue in childValues if childValue > 0), fen
+        elif value == ChessTablebase.DRAW:
+            assert ChessTablebase.DRAW in childValues and max(childValues) == ChessTablebase.DRAW, fen
+        else:
+            assert value == min(childValues), fen
+        bestMove = tablebases.bestMove(gs, validMoves)
+        if bestMove is not None:
+            gs.makeMove(bestMove)
+            assert ChessTablebase.parentValue(tablebases.probe(gs)) == value, fen
+        checked += 1
+
+def test_probe_gate(tablebases):
+    assert tablebases.mayCover(ChessEngine.createGameState("k7/8/1K6/8/8/8/7Q/8 w - - 0 1"))
+    assert tablebases.mayCover(ChessEngine.createGameState("k7/8/1K6/8/8/8/8/1BN5 w - - 0 1"))
+    assert not tablebases.mayCover(ChessEngine.createGameState("8/4k3/8/3p4/3P4/4K3/8/8 w - - 0 1")) #KPKP
+    assert not tablebases.mayCover(ChessEngine.createGameState("k7/8/1K6/8/8/8/8/1RRR4 w - - 0 1"))
+
+def test_search_uses_tables(tablebases, monkeypatch):
+    monkeypatch.setattr(ChessAI, "tablebases", tablebases)
+    gs = ChessEngine.createGameState("k7/8/1K6/8/8/8/7Q/8 w - - 0 1")
+    gs.makeMove(ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=2))
+    gs.getValidMoves()
+    assert gs.checkmate
+    #a KQK position after a capture is probed inside the search
+    gs = ChessEngine.createGameState("k7/8/1K6/8/8/8/1r6/1Q6 w - - 0 1")
+    ChessAI.transpositionTable.clear()
+    ChessAI.findBestMove(gs, gs.getValidMoves(), maxDepth=2)
+    assert ChessAI.searchStats.tablebaseHits > 0
@@ -0,0 +1,71 @@
+import io
+import time
+import ChessEngine, ChessAI, ChessUCI
+
+class Session():
+    def __init__(self):
+        self.output = io.StringIO()
+        self.engine = ChessUCI.UCIEngine(self.output)
+        self.read = 0
+
+    '''
+    Send the command lines, wait for the search they started to finish, and return the lines the engine sent
+    '''
+    def send(self, *commands, wait=True):
+        for command in commands:
+            self.engine.handle(command)
+        if wait and self.engine.searchThread is not None:
+            self.engine.searchThread.join()
+        lines = self.output.getvalue().splitlines()
+        newLines, self.read = lines[self.read:], len(lines)
+        return newLines
+
+def test_go_depth_and_stop():
+    session = Session()
+    lines = session.send("uci", "isready")
+    assert lines[-2:] == ["uciok", "readyok"]
+    lines = session.send("ucinewgame", "position startpos moves e2e4 e7e5", "go depth 3")
+    assert [line.split()[2] for line in lines if line.startswith("info depth")] == ["1", "2", "3"]
+    assert lines[-1].startswith("bestmove ")
+    gs = ChessEngine.createGameState()
+    for notation in ("e2e4", "e7e5"):
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+    assert lines[-1].split()[1] in [move.getChessNotation() for move in gs.getValidMoves()]
+    #an infinite search only answers after stop
+    lines = session.send("go infinite", wait=False)
+    time.sleep(0.2)
+    assert not any(line.startswith("bestmove") for line in lines + session.send(wait=False))
+    lines = session.send("stop")
+    assert lines[-1].startswith("bestmove ")
+    assert session.engine.searchThread is None
+
+def test_bad_input(monkeypatch):
+    monkeypatch.setattr(ChessAI, "SEARCH_WORKERS", 1)
+    session = Session()
+    sizeMB = ChessAI.transpositionTable.sizeMB
+    lines = session.send("setoption name Hash value lots", "setoption name Threads value")
+    assert [line.split()[:3] for line in lines] == [["info", "string", "hash"], ["info", "string", "threads"]]
+    assert ChessAI.transpositionTable.sizeMB == sizeMB and ChessAI.SEARCH_WORKERS == 1
+    assert session.send("position fen 8/8/8 w - - 0 1")[0].startswith("info string")
+    assert session.send("position startpos moves e2e5") == ["info string illegal move e2e5"]
+    #bad go parameters are reported and left out, the search still answers
+    lines = session.send("position startpos", "go depth x nodes")
+    assert lines[:2] == ["info string depth needs a number", "info string nodes needs a number"]
+    assert lines[-1].startswith("bestmove ")
+    lines = session.send("go depth")
+    assert lines[0] == "info string depth needs a number" and lines[-1].startswith("bestmove ")
+
+def test_mate_scores(tablebases, monkeypatch):
+    session = Session()
+    monkeypatch.setattr(ChessAI, "SEARCH_WORKERS", 1)
+    lines = session.send("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", "go depth 2")
+    assert " score mate 1 " in lines[-2] and lines[-1].startswith("bestmove a1a8")
+    #Qxb2 reaches KQK, the mate is counted from the tables
+    monkeypatch.setattr(ChessAI, "tablebases", tablebases)
+    fen = "k7/8/1K6/8/8/8/1r6/1Q6 w - - 0 1"
+    lines = session.send("ucinewgame", "position fen " + fen, "go depth 2")
+    gs = ChessEngine.createGameState(fen)
+    gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == "b1b2"))
+    plies = 1 - tablebases.probe(gs) - 1 #Qxb2, then the plies to mate from the table
+    assert " score mate %d " % ((plies + 1) // 2) in lines[-2]
+    assert lines[-1].startswith("bestmove b1b2")
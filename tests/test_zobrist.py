@@ -0,0 +1,42 @@
+import random
+import ChessEngine
+from randomgames import randomWalk, isSpecial
+
+def test_incremental_key_matches_recompute():
+    specialMoves = []
+    def check(gs):
+        assert gs.zobristKey == gs.computeZobristKey(), gs.getFEN()
+        if len(gs.moveLog) > 0 and isSpecial(gs.moveLog[-1]):
+            specialMoves.append(gs.moveLog[-1])
+    randomWalk(random.Random(1), check)
+    #the walk has to cover every kind of special move
+    assert any(move.isCastleMove for move in specialMoves)
+    assert any(move.isEnpassantMove for move in specialMoves)
+    assert any(move.pawnPromotion for move in specialMoves)
+
+def test_key_depends_on_position_only():
+    gs = ChessEngine.createGameState()
+    startKey = gs.zobristKey
+    for notation in ("g1f3", "g8f6", "f3g1", "f6g8"):
+        move = next(move for move in gs.getValidMoves() if move.getChessNotation() == notation)
+        gs.makeMove(move)
+    assert gs.zobristKey == startKey
+    assert ChessEngine.createGameState(fen=gs.getFEN()).zobristKey == startKey
+
+def playMoves(gs, notations):
+    for notation in notations:
+        gs.makeMove(next(move for move in gs.getValidMoves() if move.getChessNotation() == notation))
+    return gs
+
+def test_enpassant_file_only_hashed_when_capturable():
+    #nothing can take e4 en passant, so the knight moves repeat the position after 1.e4
+    gs = playMoves(ChessEngine.createGameState(), ["e2e4"])
+    afterPush = gs.zobristKey
+    playMoves(gs, ["g8f6", "g1f3", "f6g8", "f3g1", "g8f6", "g1f3", "f6g8", "f3g1"])
+    assert gs.zobristKeyLog.count(afterPush) == 3
+    #with a black pawn on d4 the capture is possible, and the position after the push differs from the repeats
+    gs = ChessEngine.createGameState("rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")
+    playMoves(gs, ["e2e4"])
+    afterPush = gs.zobristKey
+    playMoves(gs, ["g8f6", "g1f3", "f6g8", "f3g1"])
+    assert gs.zobristKey != afterPush